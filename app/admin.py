@@ -1,36 +1,179 @@
 # admin.py
 from django.contrib import admin
 from .models import *
-from .utils.qr import generate_qr
+from .utils.pagination import EstimatedCountPaginator
+from .utils.qr import generate_qr_codes, write_qr_sheet_pdf, write_qr_zip
+from django.http import FileResponse
+import tempfile
+
+# --------------------------------------------------
+# LARGE TABLES
+# --------------------------------------------------
+# Every __str__ here walks foreign keys, so each changelist
+# joins what its rows print (list_select_related). Foreign
+# keys to big tables use raw id / autocomplete widgets
+# instead of <select>s holding every row, and the big
+# changelists skip COUNT(*) (EstimatedCountPaginator,
+# show_full_result_count).
+# --------------------------------------------------
+
+
+class LargeTableAdmin(admin.ModelAdmin):
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
+
+class ReadOnlyAdmin(LargeTableAdmin):
+    """
+    Tables written only by the app (archives, rollups).
+    """
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
 
 @admin.register(Canteen)
 class CanteenAdmin(admin.ModelAdmin):
     list_display = ('name', 'active_manager', 'is_active')
     list_editable = ('active_manager', 'is_active')
+    list_select_related = ('active_manager',)
+    search_fields = ('name',)
+
+
+@admin.register(Lab)
+class LabAdmin(admin.ModelAdmin):
+    list_display = ('name', 'canteen')
+    list_filter = ('canteen',)
+    list_select_related = ('canteen__active_manager',)
+    search_fields = ('name', 'canteen__name')
+
+
+@admin.register(Seat)
+class SeatAdmin(LargeTableAdmin):
+    list_display = ('seat_number', 'lab')
+    list_filter = ('lab__canteen', 'lab')
+    list_select_related = ('lab__canteen',)
+    search_fields = ('seat_number', 'lab__name')
+    autocomplete_fields = ('lab',)
+
+
+@admin.register(MenuItem)
+class MenuItemAdmin(admin.ModelAdmin):
+    list_display = ('name', 'canteen', 'is_available')
+    list_editable = ('is_available',)
+    list_filter = ('canteen', 'is_available')
+    list_select_related = ('canteen__active_manager',)
+    search_fields = ('name', 'canteen__name')
+
+
+@admin.register(ItemOption)
+class ItemOptionAdmin(admin.ModelAdmin):
+    list_display = ('name', 'menu_item')
+    list_filter = ('menu_item__canteen',)
+    list_select_related = ('menu_item__canteen',)
+    search_fields = ('name', 'menu_item__name')
+    autocomplete_fields = ('menu_item',)
 
-admin.site.register(Lab)
-admin.site.register(Seat)
-admin.site.register(MenuItem)
-admin.site.register(Order)
-admin.site.register(ItemOption)
-admin.site.register(CanteenManager)
+
+@admin.register(Order)
+class OrderAdmin(LargeTableAdmin):
+    list_display = ('item', 'seat', 'option', 'canteen', 'status', 'created_at', 'delivered_at')
+    # Both filters hit order_canteen_status_created
+    list_filter = ('status', 'canteen')
+    list_select_related = ('item__canteen', 'seat__lab', 'option__menu_item', 'canteen__active_manager')
+    date_hierarchy = 'created_at'
+    # Newest first by primary key: no sort over the whole table
+    ordering = ('-id',)
+    search_fields = ('=order_id', '=request_id')
+    raw_id_fields = ('seat',)
+    autocomplete_fields = ('item', 'option')
+    readonly_fields = ('order_id', 'canteen', 'created_at', 'updated_at', 'delivered_at')
+
+
+@admin.register(CanteenManager)
+class CanteenManagerAdmin(admin.ModelAdmin):
+    list_display = ('user', 'canteen')
+    list_filter = ('canteen',)
+    list_select_related = ('user', 'canteen__active_manager')
+    autocomplete_fields = ('user', 'canteen')
+
+
+@admin.register(CanteenOrderStats)
+class CanteenOrderStatsAdmin(admin.ModelAdmin):
+    list_display = ('canteen', 'new_count', 'delivered_count', 'updated_at')
+    list_select_related = ('canteen__active_manager',)
+
+    # One row per canteen, kept by the app: no estimates, no edits
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(ArchivedOrder)
+class ArchivedOrderAdmin(ReadOnlyAdmin):
+    list_display = ('item_name', 'option_name', 'lab_name', 'seat_number', 'canteen_name', 'status', 'created_at')
+    # Filters on canteen + created_at ride archived_canteen_created
+    list_filter = ('canteen', 'status')
+    date_hierarchy = 'created_at'
+    ordering = ('-id',)
+    search_fields = ('=order_id',)
+
+
+@admin.register(OrderDailyRollup)
+class OrderDailyRollupAdmin(ReadOnlyAdmin):
+    list_display = ('day', 'canteen', 'item_name', 'order_count')
+    list_filter = ('canteen',)
+    list_select_related = ('canteen__active_manager',)
+    date_hierarchy = 'day'
+
+
+@admin.register(DeliveryTimeRollup)
+class DeliveryTimeRollupAdmin(ReadOnlyAdmin):
+    list_display = ('hour', 'canteen', 'lab', 'item', 'order_count', 'max_seconds')
+    list_filter = ('canteen',)
+    list_select_related = ('canteen__active_manager', 'lab__canteen', 'item__canteen')
+    date_hierarchy = 'hour'
+    ordering = ('-hour',)
 
 
 @admin.register(QRCode)
-class QRCodeAdmin(admin.ModelAdmin):
+class QRCodeAdmin(LargeTableAdmin):
     list_display = ('seat', 'qr_id', 'is_active')
-    actions = ['generate_qr_codes']
+    list_filter = ('is_active', 'seat__lab__canteen', 'seat__lab')
+    list_select_related = ('seat__lab',)
+    search_fields = ('=qr_id', 'seat__seat_number')
+    autocomplete_fields = ('seat',)
+    actions = ['generate_qr_codes', 'download_qr_zip', 'download_qr_sheet']
     actions_on_top = True
     actions_on_bottom = True
 
+    def _ordered(self, queryset):
+        return queryset.select_related('seat__lab').order_by('seat__lab__name', 'seat__seat_number')
+
     @admin.action(description="Generate QR codes for selected seats")
     def generate_qr_codes(self, request, queryset):
-        count = 0
-        for qr in queryset:
-            generate_qr(qr)
-            count += 1
+        generated, skipped = generate_qr_codes(queryset)
 
         self.message_user(
             request,
-            f"{count} QR code(s) generated successfully."
+            f"{generated} QR code(s) generated successfully, {skipped} already up to date."
         )
+
+    @admin.action(description="Download selected QR codes (ZIP)")
+    def download_qr_zip(self, request, queryset):
+        buffer = tempfile.SpooledTemporaryFile(max_size=10 * 1024 * 1024)
+        write_qr_zip(self._ordered(queryset), buffer)
+        buffer.seek(0)
+        return FileResponse(buffer, as_attachment=True, filename="qr_codes.zip")
+
+    @admin.action(description="Download printable sheet of selected QR codes (PDF)")
+    def download_qr_sheet(self, request, queryset):
+        buffer = tempfile.SpooledTemporaryFile(max_size=10 * 1024 * 1024)
+        write_qr_sheet_pdf(self._ordered(queryset), buffer)
+        buffer.seek(0)
+        return FileResponse(buffer, as_attachment=True, filename="qr_codes.pdf")
@@ -0,0 +1,59 @@
+import os
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from app.utils.archive import archive_delivered_orders
+
+
+class Command(BaseCommand):
+    help = (
+        "Move DELIVERED orders older than --days out of the live Order table, "
+        "in small batches, keeping daily per-item rollups. "
+        "Meant to run from cron, e.g. nightly: python manage.py archive_orders"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--days', type=int,
+            default=getattr(settings, 'ORDER_ARCHIVE_DAYS', 30),
+            help="Archive orders created more than this many days ago.",
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=500,
+            help="Orders moved per transaction.",
+        )
+        parser.add_argument(
+            '--to', choices=['table', 'files'], default='table',
+            help="ArchivedOrder table (default) or compressed daily files.",
+        )
+        parser.add_argument(
+            '--output-dir',
+            default=getattr(settings, 'ORDER_ARCHIVE_DIR', os.path.join(settings.BASE_DIR, 'archive')),
+            help="Directory for --to files.",
+        )
+        parser.add_argument(
+            '--pause', type=float, default=0,
+            help="Seconds to sleep between batches, to leave room for live writes.",
+        )
+        parser.add_argument('--dry-run', action='store_true', help="Only count what would be archived.")
+
+    def handle(self, *args, **options):
+        cutoff = timezone.now() - timedelta(days=options['days'])
+        output_dir = options['output_dir'] if options['to'] == 'files' else None
+
+        count = archive_delivered_orders(
+            cutoff,
+            batch_size=options['batch_size'],
+            output_dir=output_dir,
+            pause=options['pause'],
+            dry_run=options['dry_run'],
+        )
+
+        if options['dry_run']:
+            self.stdout.write(f"{count} order(s) would be archived.")
+        else:
+            where = output_dir or "the ArchivedOrder table"
+            self.stdout.write(self.style.SUCCESS(f"{count} order(s) archived to {where}."))
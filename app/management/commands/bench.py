@@ -0,0 +1,337 @@
+import asyncio
+import json
+import random
+import statistics
+import threading
+import time
+import uuid
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import connection, connections
+from django.test import AsyncClient, Client, override_settings
+from django.test.utils import setup_test_environment, teardown_test_environment
+
+from app.models import Canteen, ItemOption, Lab, MenuItem, Order, QRCode, Seat
+from app.utils.metrics import install_query_hook, record_queries
+
+# --------------------------------------------------
+# LOAD TEST / BENCHMARK
+# --------------------------------------------------
+# Seeds a throwaway test database, drives the customer and
+# dashboard views through the Django test client from many
+# threads, and reports throughput, latency percentiles and
+# SQL queries per request. Results can be saved as JSON and
+# compared against an earlier run with --baseline.
+#
+# --asgi sends the customer traffic through the ASGI handler
+# and project/asgi_urls.py (native async views), all seats
+# sharing one event loop, to compare against the threaded
+# WSGI path.
+# --------------------------------------------------
+
+ENDPOINTS = [
+    'scan_qr',
+    'place_order',
+    'get_new_orders',
+    'get_order_stats',
+    'mark_order_done',
+    'serve_qr_code',
+]
+
+
+class Recorder:
+    """
+    Collects (latency, queries, ok) samples per endpoint from many threads.
+    """
+
+    def __init__(self):
+        self.samples = {}
+        self._lock = threading.Lock()
+
+    def _add(self, name, elapsed, queries, response):
+        ok = response is not None and response.status_code < 400
+        with self._lock:
+            self.samples.setdefault(name, []).append((elapsed, queries.count, ok))
+
+    def call(self, name, func):
+        with record_queries() as queries:
+            start = time.perf_counter()
+            try:
+                response = func()
+            except Exception:
+                response = None
+            elapsed = time.perf_counter() - start
+        self._add(name, elapsed, queries, response)
+        return response
+
+    async def acall(self, name, coro_func):
+        with record_queries() as queries:
+            start = time.perf_counter()
+            try:
+                response = await coro_func()
+            except Exception:
+                response = None
+            elapsed = time.perf_counter() - start
+        self._add(name, elapsed, queries, response)
+        return response
+
+    def summary(self, wall_time):
+        results = {}
+        for name, samples in sorted(self.samples.items()):
+            latencies = sorted(s[0] for s in samples)
+            cuts = statistics.quantiles(latencies, n=100, method='inclusive') if len(latencies) > 1 else latencies * 99
+            results[name] = {
+                'requests': len(samples),
+                'errors': sum(1 for s in samples if not s[2]),
+                'throughput_rps': round(len(samples) / wall_time, 1) if wall_time else None,
+                'p50_ms': round(cuts[49] * 1000, 2),
+                'p95_ms': round(cuts[94] * 1000, 2),
+                'p99_ms': round(cuts[98] * 1000, 2),
+                'queries_per_request': round(statistics.mean(s[1] for s in samples), 2),
+            }
+        return results
+
+
+def run_threads(targets):
+    def wrapped(target):
+        try:
+            target()
+        finally:
+            connections.close_all()
+
+    threads = [threading.Thread(target=wrapped, args=(target,)) for target in targets]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return time.perf_counter() - start
+
+
+class Command(BaseCommand):
+    help = (
+        "Seed a throwaway database and benchmark the ordering and dashboard "
+        "views: throughput, p50/p95/p99 latency and SQL queries per request."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--canteens', type=int, default=2)
+        parser.add_argument('--labs', type=int, default=3, help="Labs per canteen.")
+        parser.add_argument('--seats', type=int, default=40, help="Seats per lab.")
+        parser.add_argument('--items', type=int, default=10, help="Menu items per canteen.")
+        parser.add_argument('--history', type=int, default=2000,
+                            help="Delivered orders to pre-load, spread over the canteens.")
+        parser.add_argument('--seat-clients', type=int, default=8,
+                            help="Concurrent customer threads (scan -> order).")
+        parser.add_argument('--managers', type=int, default=4,
+                            help="Concurrent dashboards polling orders and stats.")
+        parser.add_argument('--requests', type=int, default=50,
+                            help="Requests per thread and endpoint.")
+        parser.add_argument('--asgi', action='store_true',
+                            help="Serve customer traffic with the async views over ASGI.")
+        parser.add_argument('--ingest-queue', action='store_true',
+                            help="Route place_order through the single-writer ingest queue.")
+        parser.add_argument('--output', help="Write the results as JSON to this file.")
+        parser.add_argument('--baseline', help="Compare against an earlier --output file.")
+        parser.add_argument('--use-configured-cache', action='store_true',
+                            help="Run against CACHES as configured instead of a private in-memory cache.")
+
+    def handle(self, *args, **options):
+        setup_test_environment()
+        install_query_hook()
+        old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+        overrides = {'ORDER_INGEST_QUEUE': options['ingest_queue']}
+        if options['asgi']:
+            overrides['ROOT_URLCONF'] = 'project.asgi_urls'
+        if not options['use_configured_cache']:
+            overrides['CACHES'] = {'default': {
+                'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+                'LOCATION': f'bench-{uuid.uuid4()}',
+            }}
+        try:
+            with override_settings(**overrides):
+                results = self.run(options)
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            teardown_test_environment()
+
+        self.report(results, options)
+
+    # -- seeding ------------------------------------------------------
+
+    def seed(self, options):
+        password = 'bench'
+        managers = []
+        seats_by_canteen = {}
+        items_by_canteen = {}
+
+        for c in range(options['canteens']):
+            user = User.objects.create_user(f'bench-manager-{c}', password=password)
+            canteen = Canteen.objects.create(name=f'Canteen {c}', active_manager=user)
+            managers.append(user.username)
+
+            labs = Lab.objects.bulk_create([
+                Lab(name=f'Lab {c}-{l}', canteen=canteen) for l in range(options['labs'])
+            ])
+            seats = Seat.objects.bulk_create([
+                Seat(lab=lab, seat_number=str(n))
+                for lab in labs for n in range(1, options['seats'] + 1)
+            ])
+            QRCode.objects.bulk_create([QRCode(seat=seat) for seat in seats])
+            seats_by_canteen[canteen.id] = list(
+                QRCode.objects.filter(seat__lab__canteen=canteen).values_list('qr_id', flat=True)
+            )
+
+            items = [MenuItem.objects.create(canteen=canteen, name=f'Item {c}-{i}') for i in range(options['items'])]
+            for item in items[::2]:
+                ItemOption.objects.create(menu_item=item, name='Sugar')
+                ItemOption.objects.create(menu_item=item, name='No Sugar')
+            items_by_canteen[canteen.id] = [item.id for item in items]
+
+        # Delivered history, so list and count queries have rows to skip
+        all_seats = list(Seat.objects.select_related('lab'))
+        history = []
+        for n in range(options['history']):
+            seat = all_seats[n % len(all_seats)]
+            history.append(Order(
+                seat=seat,
+                canteen_id=seat.lab.canteen_id,
+                item_id=random.choice(items_by_canteen[seat.lab.canteen_id]),
+                status='DELIVERED',
+            ))
+        Order.objects.bulk_create(history, batch_size=500)
+
+        from app.utils.stats import rebuild_order_counts
+        rebuild_order_counts()
+        return managers, password, seats_by_canteen, items_by_canteen
+
+    # -- scenarios ----------------------------------------------------
+
+    def run(self, options):
+        managers, password, seats_by_canteen, items_by_canteen = self.seed(options)
+        per_thread = options['requests']
+        canteen_ids = list(seats_by_canteen)
+        all_qr_ids = [qr for qrs in seats_by_canteen.values() for qr in qrs]
+        recorder = Recorder()
+        phases = {}
+
+        def customer(index):
+            client = Client()
+            canteen_id = canteen_ids[index % len(canteen_ids)]
+            for _ in range(per_thread):
+                qr_id = random.choice(seats_by_canteen[canteen_id])
+                recorder.call('scan_qr', lambda: client.get(f'/scan/{qr_id}/'))
+                recorder.call('place_order', lambda: client.post(f'/place_order/{qr_id}/', {
+                    'item_id': random.choice(items_by_canteen[canteen_id]),
+                    'request_id': str(uuid.uuid4()),
+                }))
+
+        async def async_customer(index):
+            client = AsyncClient()
+            canteen_id = canteen_ids[index % len(canteen_ids)]
+            for _ in range(per_thread):
+                qr_id = random.choice(seats_by_canteen[canteen_id])
+                await recorder.acall('scan_qr', lambda: client.get(f'/scan/{qr_id}/'))
+                await recorder.acall('place_order', lambda: client.post(f'/place_order/{qr_id}/', {
+                    'item_id': random.choice(items_by_canteen[canteen_id]),
+                    'request_id': str(uuid.uuid4()),
+                }))
+
+        def async_customers():
+            async def main():
+                await asyncio.gather(*(async_customer(i) for i in range(options['seat_clients'])))
+            asyncio.run(main())
+
+        def dashboard(index):
+            client = Client()
+            client.login(username=managers[index % len(managers)], password=password)
+            etag = None
+            for _ in range(per_thread):
+                headers = {'HTTP_IF_NONE_MATCH': etag} if etag else {}
+                response = recorder.call('get_new_orders', lambda: client.get('/get_new_orders/?status=NEW', **headers))
+                if response is not None and response.has_header('ETag'):
+                    etag = response['ETag']
+                recorder.call('get_order_stats', lambda: client.get('/get_order_stats/'))
+
+        def deliverer(index):
+            client = Client()
+            username = managers[index % len(managers)]
+            client.login(username=username, password=password)
+            pending = list(
+                Order.objects.filter(status='NEW', canteen__active_manager__username=username)
+                .values_list('order_id', flat=True)[:per_thread]
+            )
+            for order_id in pending:
+                recorder.call('mark_order_done', lambda: client.post(f'/mark_order_done/{order_id}/'))
+
+        def qr_images(index):
+            client = Client()
+            for _ in range(per_thread):
+                qr_id = random.choice(all_qr_ids)
+                recorder.call('serve_qr_code', lambda: client.get(f'/qr_image/{qr_id}/'))
+
+        def each(target, count):
+            return [lambda i=i: target(i) for i in range(count)]
+
+        # Lunch peak: customers ordering while dashboards poll
+        customers = [async_customers] if options['asgi'] else each(customer, options['seat_clients'])
+        phases['mixed'] = run_threads(customers + each(dashboard, options['managers']))
+        phases['deliver'] = run_threads(each(deliverer, options['managers']))
+        phases['qr_images'] = run_threads(each(qr_images, options['seat_clients']))
+
+        wall = {
+            'scan_qr': phases['mixed'],
+            'place_order': phases['mixed'],
+            'get_new_orders': phases['mixed'],
+            'get_order_stats': phases['mixed'],
+            'mark_order_done': phases['deliver'],
+            'serve_qr_code': phases['qr_images'],
+        }
+        results = {}
+        for name in ENDPOINTS:
+            if name in recorder.samples:
+                one = Recorder()
+                one.samples = {name: recorder.samples[name]}
+                results.update(one.summary(wall[name]))
+
+        return {
+            'params': {key: options[key] for key in (
+                'canteens', 'labs', 'seats', 'items', 'history',
+                'seat_clients', 'managers', 'requests', 'asgi', 'ingest_queue',
+            )},
+            'database': connection.vendor,
+            'phases_s': {name: round(t, 3) for name, t in phases.items()},
+            'endpoints': results,
+        }
+
+    # -- output -------------------------------------------------------
+
+    def report(self, results, options):
+        baseline = None
+        if options['baseline']:
+            with open(options['baseline']) as f:
+                baseline = json.load(f)['endpoints']
+
+        header = f"{'endpoint':<18}{'req':>7}{'err':>5}{'rps':>9}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'queries':>9}"
+        self.stdout.write(header)
+        for name, row in results['endpoints'].items():
+            self.stdout.write(
+                f"{name:<18}{row['requests']:>7}{row['errors']:>5}{row['throughput_rps']:>9}"
+                f"{row['p50_ms']:>9}{row['p95_ms']:>9}{row['p99_ms']:>9}{row['queries_per_request']:>9}"
+            )
+            if baseline and name in baseline:
+                old = baseline[name]
+                self.stdout.write(
+                    f"{'  vs baseline':<18}{'':>12}"
+                    f"{row['throughput_rps'] - old['throughput_rps']:>+9.1f}"
+                    f"{row['p50_ms'] - old['p50_ms']:>+9.2f}"
+                    f"{row['p95_ms'] - old['p95_ms']:>+9.2f}"
+                    f"{row['p99_ms'] - old['p99_ms']:>+9.2f}"
+                    f"{row['queries_per_request'] - old['queries_per_request']:>+9.2f}"
+                )
+
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                json.dump(results, f, indent=2)
+            self.stdout.write(self.style.SUCCESS(f"Results written to {options['output']}"))
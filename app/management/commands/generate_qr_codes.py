@@ -0,0 +1,58 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from app.models import QRCode
+from app.utils.qr import generate_qr_codes, write_qr_sheet_pdf, write_qr_zip
+
+
+class Command(BaseCommand):
+    help = (
+        "Render QR code images for whole labs / canteens in parallel, "
+        "and optionally export them as a ZIP or a printable PDF sheet."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--canteen', type=int, action='append', dest='canteens',
+                            help="Canteen id to include (repeatable). Default: all.")
+        parser.add_argument('--lab', type=int, action='append', dest='labs',
+                            help="Lab id to include (repeatable). Default: all.")
+        parser.add_argument('--include-inactive', action='store_true',
+                            help="Also process deactivated QR codes.")
+        parser.add_argument('--workers', type=int, default=None,
+                            help="Encoder processes (default: CPU count, 1 = no pool).")
+        parser.add_argument('--force', action='store_true',
+                            help="Re-render images even if they are up to date.")
+        parser.add_argument('--zip', metavar='PATH',
+                            help="Also write a ZIP of the PNGs to PATH.")
+        parser.add_argument('--pdf', metavar='PATH',
+                            help="Also write a print-ready PDF sheet to PATH.")
+
+    def handle(self, *args, **options):
+        qr_codes = QRCode.objects.select_related('seat__lab').order_by(
+            'seat__lab__canteen', 'seat__lab__name', 'seat__seat_number'
+        )
+        if options['canteens']:
+            qr_codes = qr_codes.filter(seat__lab__canteen__in=options['canteens'])
+        if options['labs']:
+            qr_codes = qr_codes.filter(seat__lab__in=options['labs'])
+        if not options['include_inactive']:
+            qr_codes = qr_codes.filter(is_active=True)
+
+        qr_codes = list(qr_codes)
+        if not qr_codes:
+            raise CommandError("No QR codes match the given filters.")
+
+        workers = options['workers']
+        generated, skipped = generate_qr_codes(qr_codes, workers=workers, force=options['force'])
+        self.stdout.write(f"{generated} QR image(s) generated, {skipped} already up to date.")
+
+        if options['zip']:
+            with open(options['zip'], 'wb') as f:
+                write_qr_zip(qr_codes, f, workers=workers)
+            self.stdout.write(f"ZIP written to {options['zip']}")
+
+        if options['pdf']:
+            with open(options['pdf'], 'wb') as f:
+                write_qr_sheet_pdf(qr_codes, f, workers=workers)
+            self.stdout.write(f"PDF sheet written to {options['pdf']}")
+
+        self.stdout.write(self.style.SUCCESS("Done."))
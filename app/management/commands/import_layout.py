@@ -0,0 +1,55 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from app.models import QRCode
+from app.utils.layout import LayoutError, import_layout, load_layout
+from app.utils.qr import generate_qr_codes
+
+
+class Command(BaseCommand):
+    help = (
+        "Create canteens, labs, seat ranges with their QR codes, and menu items "
+        "from a JSON or CSV layout file (see app/utils/layout.py for the format). "
+        "Safe to re-run: only what is missing is created."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help="Layout file (.json or .csv).")
+        parser.add_argument('--batch-size', type=int, default=1000,
+                            help="Rows per bulk INSERT.")
+        parser.add_argument('--render', action='store_true',
+                            help="Also render QR images for the layout's labs.")
+        parser.add_argument('--workers', type=int, default=None,
+                            help="Encoder processes for --render (default: CPU count, 1 = no pool).")
+        parser.add_argument('--dry-run', action='store_true',
+                            help="Only report what would be created.")
+
+    def handle(self, *args, **options):
+        try:
+            layout = load_layout(options['path'])
+            created, lab_ids = import_layout(
+                layout, batch_size=options['batch_size'], dry_run=options['dry_run'],
+            )
+        except LayoutError as e:
+            raise CommandError(str(e))
+        except KeyError as e:
+            raise CommandError(f"Layout entry without {e}.")
+        except (OSError, ValueError) as e:
+            # Unreadable file or invalid JSON
+            raise CommandError(f"Could not read {options['path']}: {e}")
+
+        summary = ", ".join(
+            f"{created[kind]} {kind.replace('_', ' ')}"
+            for kind in ('canteens', 'labs', 'seats', 'qr_codes', 'items', 'options')
+        )
+        if options['dry_run']:
+            self.stdout.write(f"Would create {summary}.")
+            return
+        self.stdout.write(f"Created {summary}.")
+
+        if options['render']:
+            # After the commit: images go to storage, not the transaction
+            qr_codes = QRCode.objects.filter(seat__lab__in=lab_ids, is_active=True)
+            generated, skipped = generate_qr_codes(qr_codes, workers=options['workers'])
+            self.stdout.write(f"{generated} QR image(s) generated, {skipped} already up to date.")
+
+        self.stdout.write(self.style.SUCCESS("Done."))
@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand
+
+from app.utils.publish import publish_all_menus, publish_menu
+
+
+class Command(BaseCommand):
+    help = "Render the customer menu page and JSON of each canteen to static files."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--canteen',
+            type=int,
+            action='append',
+            dest='canteens',
+            help="Only publish this canteen id (repeatable).",
+        )
+
+    def handle(self, *args, **options):
+        if options['canteens']:
+            published = sum(publish_menu(canteen_id) for canteen_id in options['canteens'])
+        else:
+            published = publish_all_menus()
+        self.stdout.write(self.style.SUCCESS(f"Published {published} menu(s)."))
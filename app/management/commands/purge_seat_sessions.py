@@ -0,0 +1,45 @@
+import time
+
+from django.contrib.sessions.backends.db import SessionStore
+from django.contrib.sessions.models import Session
+from django.core.management.base import BaseCommand
+
+
+class Command(BaseCommand):
+    help = (
+        "Delete expired sessions and the anonymous sessions that only held the "
+        "scanned seat (qr_id), left over from before the seat moved to a cookie."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--pause', type=float, default=0,
+                            help="Seconds to sleep between delete batches.")
+        parser.add_argument('--dry-run', action='store_true')
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        store = SessionStore()
+
+        if not options['dry_run']:
+            SessionStore.clear_expired()
+
+        seat_only = []
+        rows = Session.objects.values_list('session_key', 'session_data').iterator(chunk_size=batch_size)
+        for session_key, session_data in rows:
+            data = store.decode(session_data)
+            if set(data) <= {'qr_id'}:
+                seat_only.append(session_key)
+
+        if options['dry_run']:
+            self.stdout.write(f"{len(seat_only)} seat-only session(s) would be deleted.")
+            return
+
+        for start in range(0, len(seat_only), batch_size):
+            Session.objects.filter(session_key__in=seat_only[start:start + batch_size]).delete()
+            if options['pause']:
+                time.sleep(options['pause'])
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Deleted expired sessions and {len(seat_only)} seat-only session(s)."
+        ))
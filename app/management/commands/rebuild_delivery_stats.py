@@ -0,0 +1,43 @@
+from datetime import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+
+from app.utils.delivery import rebuild_delivery_rollups
+
+
+class Command(BaseCommand):
+    help = (
+        "Rebuild the delivery time rollups from the delivered orders in Order. "
+        "Archived orders are gone from Order, so only the hours after the oldest "
+        "live delivered order are rebuilt once archive_orders has run; earlier "
+        "rollups are kept. --since overrides the start, and everything before it "
+        "is kept as is."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=2000)
+        parser.add_argument('--since', metavar='DATE[THH:MM]',
+                            help="Rebuild hours from this date / time on (local time).")
+
+    def handle(self, *args, **options):
+        since = None
+        if options['since']:
+            since = parse_datetime(options['since'])
+            if since is None:
+                day = parse_date(options['since'])
+                if day is None:
+                    raise CommandError(f"Invalid --since: {options['since']}")
+                since = datetime(day.year, day.month, day.day)
+            if timezone.is_naive(since):
+                since = timezone.make_aware(since)
+
+        start, folded = rebuild_delivery_rollups(options['batch_size'], since=since)
+        if start is False:
+            self.stdout.write("No live delivered orders; the archived rollups were left alone.")
+            return
+        scope = f"from {timezone.localtime(start):%Y-%m-%d %H:00}" if start else "for all hours"
+        self.stdout.write(self.style.SUCCESS(
+            f"Delivery rollups rebuilt {scope} from {folded} delivered order(s)."
+        ))
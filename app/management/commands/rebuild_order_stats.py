@@ -0,0 +1,29 @@
+from django.core.management.base import BaseCommand
+
+from app.utils.stats import rebuild_order_counts
+
+
+class Command(BaseCommand):
+    help = "Recount orders per canteen and rebuild the CanteenOrderStats counters."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--canteen',
+            type=int,
+            action='append',
+            dest='canteens',
+            help="Only rebuild this canteen id (repeatable).",
+        )
+
+    def handle(self, *args, **options):
+        drifted = rebuild_order_counts(options['canteens'])
+
+        for canteen_id, (old, new) in sorted(drifted.items()):
+            self.stdout.write(
+                f"Canteen #{canteen_id}: "
+                f"new {old['new_count']} -> {new['new_count']}, "
+                f"delivered {old['delivered_count']} -> {new['delivered_count']}"
+            )
+        self.stdout.write(self.style.SUCCESS(
+            f"Order stats rebuilt ({len(drifted)} canteen(s) corrected)."
+        ))
@@ -0,0 +1,124 @@
+# middleware.py
+import logging
+import random
+import re
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.middleware.gzip import GZipMiddleware
+from django.utils.cache import patch_vary_headers
+
+try:
+    import brotli
+except ImportError:  # optional: gzip only
+    brotli = None
+
+from .utils.metrics import install_query_hook, record_queries, registry
+
+logger = logging.getLogger(__name__)
+
+
+class RequestMetricsMiddleware:
+    """
+    Records latency, SQL query count and SQL time per URL name for a
+    sample of requests (settings.REQUEST_METRICS_SAMPLE_RATE) and flags
+    statements repeated more than settings.REQUEST_METRICS_N_PLUS_ONE
+    times in one request. Removed from the stack when the rate is 0.
+
+    Works in both sync and async stacks, so it never forces the async
+    customer views (project/asgi_urls.py) back onto a thread.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.sample_rate = getattr(settings, 'REQUEST_METRICS_SAMPLE_RATE', 0)
+        self.n_plus_one = getattr(settings, 'REQUEST_METRICS_N_PLUS_ONE', 5)
+        if not self.sample_rate:
+            raise MiddlewareNotUsed
+        install_query_hook()
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def _sampled(self):
+        return self.sample_rate >= 1 or random.random() < self.sample_rate
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        if not self._sampled():
+            return self.get_response(request)
+
+        start = time.perf_counter()
+        with record_queries() as queries:
+            response = self.get_response(request)
+        self._record(request, response, time.perf_counter() - start, queries)
+        return response
+
+    async def __acall__(self, request):
+        if not self._sampled():
+            return await self.get_response(request)
+
+        start = time.perf_counter()
+        with record_queries() as queries:
+            response = await self.get_response(request)
+        self._record(request, response, time.perf_counter() - start, queries)
+        return response
+
+    def _record(self, request, response, duration, queries):
+        match = getattr(request, 'resolver_match', None)
+        view = (match.view_name if match else None) or 'unmatched'
+
+        repeated = [(sql, n) for sql, n in queries.statements.items() if n > self.n_plus_one]
+        for sql, n in repeated:
+            logger.warning("Possible N+1 in %s: %d x %s", view, n, sql)
+
+        registry.record(view, response.status_code, duration, queries.count, queries.seconds, len(repeated))
+
+
+accepts_brotli = re.compile(r"\bbr\b")
+
+# PNGs and other binary formats are compressed already
+COMPRESSIBLE_TYPES = ('text/', 'application/json', 'application/javascript', 'image/svg+xml')
+
+
+class CompressionMiddleware(GZipMiddleware):
+    """
+    GZipMiddleware, preferring brotli when the `brotli` module is
+    installed and the client accepts it. Only text-like types are
+    compressed. Event streams are passed through untouched: a
+    compressor buffers, which would hold back live order events.
+    """
+
+    brotli_quality = 5
+
+    def process_response(self, request, response):
+        content_type = response.get('Content-Type', '')
+        if content_type.startswith('text/event-stream') or not content_type.startswith(COMPRESSIBLE_TYPES):
+            return response
+        if (
+            brotli is None
+            or response.streaming
+            or response.has_header('Content-Encoding')
+            or len(response.content) < 200
+            or not accepts_brotli.search(request.META.get('HTTP_ACCEPT_ENCODING', ''))
+        ):
+            return super().process_response(request, response)
+
+        patch_vary_headers(response, ('Accept-Encoding',))
+        compressed = brotli.compress(response.content, quality=self.brotli_quality)
+        if len(compressed) >= len(response.content):
+            return response
+
+        response.content = compressed
+        response['Content-Length'] = str(len(compressed))
+        # The body is no longer byte-for-byte what a strong ETag promised
+        etag = response.get('ETag')
+        if etag and etag.startswith('"'):
+            response['ETag'] = 'W/' + etag
+        response['Content-Encoding'] = 'br'
+        return response
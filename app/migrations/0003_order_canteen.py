@@ -0,0 +1,56 @@
+# Generated by Django 6.0.1 on 2026-01-24 09:12
+
+import django.db.models.deletion
+from django.db import migrations, models, transaction
+from django.db.models import OuterRef, Subquery
+
+# Rows copied per transaction, so the backfill never holds
+# the write lock for long on a large table.
+BATCH_SIZE = 2000
+
+
+def backfill_canteen(apps, schema_editor):
+    Order = apps.get_model('app', 'Order')
+    Seat = apps.get_model('app', 'Seat')
+    db = schema_editor.connection.alias
+
+    canteen_of_seat = Subquery(
+        Seat.objects.using(db).filter(pk=OuterRef('seat_id')).values('lab__canteen_id')[:1]
+    )
+    last_id = Order.objects.using(db).aggregate(models.Max('id'))['id__max'] or 0
+    start = 0
+    while start <= last_id:
+        with transaction.atomic(using=db):
+            Order.objects.using(db).filter(
+                id__gte=start,
+                id__lt=start + BATCH_SIZE,
+                canteen__isnull=True,
+            ).update(canteen_id=canteen_of_seat)
+        start += BATCH_SIZE
+
+
+class Migration(migrations.Migration):
+
+    # Each backfill batch commits on its own
+    atomic = False
+
+    dependencies = [
+        ('app', '0002_order_updated_at'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='order',
+            name='canteen',
+            field=models.ForeignKey(blank=True, db_index=False, editable=False, null=True, on_delete=django.db.models.deletion.CASCADE, to='app.canteen'),
+        ),
+        migrations.RunPython(backfill_canteen, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['canteen', 'status', '-created_at'], name='order_canteen_status_created'),
+        ),
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['canteen', 'updated_at'], name='order_canteen_updated'),
+        ),
+    ]
@@ -0,0 +1,50 @@
+# Generated by Django 6.0.1 on 2026-01-27 11:30
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def populate_stats(apps, schema_editor):
+    Order = apps.get_model('app', 'Order')
+    CanteenOrderStats = apps.get_model('app', 'CanteenOrderStats')
+    db = schema_editor.connection.alias
+
+    stats = {}
+    rows = (
+        Order.objects.using(db)
+        .exclude(canteen=None)
+        .values_list('canteen', 'status')
+        .annotate(total=Count('id'))
+        .order_by()
+    )
+    for canteen_id, status, total in rows:
+        row = stats.setdefault(canteen_id, CanteenOrderStats(canteen_id=canteen_id))
+        if status == 'NEW':
+            row.new_count = total
+        elif status == 'DELIVERED':
+            row.delivered_count = total
+    CanteenOrderStats.objects.using(db).bulk_create(stats.values())
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0003_order_canteen'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CanteenOrderStats',
+            fields=[
+                ('canteen', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='order_stats', serialize=False, to='app.canteen')),
+                ('new_count', models.IntegerField(default=0)),
+                ('delivered_count', models.IntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name_plural': 'canteen order stats',
+            },
+        ),
+        migrations.RunPython(populate_stats, migrations.RunPython.noop),
+    ]
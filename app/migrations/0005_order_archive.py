@@ -0,0 +1,46 @@
+# Generated by Django 6.0.1 on 2026-02-03 14:21
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0004_canteenorderstats'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArchivedOrder',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('order_id', models.UUIDField(unique=True)),
+                ('canteen_name', models.CharField(max_length=100)),
+                ('lab_name', models.CharField(max_length=100)),
+                ('seat_number', models.CharField(max_length=20)),
+                ('item_name', models.CharField(max_length=100)),
+                ('option_name', models.CharField(blank=True, max_length=50)),
+                ('status', models.CharField(max_length=10)),
+                ('created_at', models.DateTimeField()),
+                ('archived_at', models.DateTimeField(auto_now_add=True)),
+                ('canteen', models.ForeignKey(db_index=False, null=True, on_delete=django.db.models.deletion.SET_NULL, to='app.canteen')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['canteen', 'created_at'], name='archived_canteen_created')],
+            },
+        ),
+        migrations.CreateModel(
+            name='OrderDailyRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('item_name', models.CharField(max_length=100)),
+                ('order_count', models.IntegerField(default=0)),
+                ('canteen', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='app.canteen')),
+            ],
+            options={
+                'unique_together': {('canteen', 'day', 'item_name')},
+            },
+        ),
+    ]
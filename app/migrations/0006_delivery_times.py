@@ -0,0 +1,45 @@
+# Generated by Django 6.0.1 on 2026-10-18 08:18
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def backfill_delivered_at(apps, schema_editor):
+    # The last status change is the best record of delivery we have;
+    # run rebuild_delivery_stats afterwards to fill the rollups
+    Order = apps.get_model('app', 'Order')
+    Order.objects.filter(status='DELIVERED').update(delivered_at=models.F('updated_at'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0005_order_archive'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='order',
+            name='delivered_at',
+            field=models.DateTimeField(blank=True, editable=False, null=True),
+        ),
+        migrations.RunPython(backfill_delivered_at, migrations.RunPython.noop),
+        migrations.CreateModel(
+            name='DeliveryTimeRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('hour', models.DateTimeField()),
+                ('order_count', models.IntegerField(default=0)),
+                ('total_seconds', models.FloatField(default=0)),
+                ('max_seconds', models.FloatField(default=0)),
+                ('histogram', models.JSONField(default=list)),
+                ('canteen', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='app.canteen')),
+                ('item', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='app.menuitem')),
+                ('lab', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='app.lab')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['canteen', 'hour'], name='delivery_canteen_hour')],
+                'unique_together': {('canteen', 'lab', 'item', 'hour')},
+            },
+        ),
+    ]
@@ -135,10 +135,74 @@ class ItemOption(models.Model):
 # Only NEW and DELIVERED states.
 # --------------------------------------------------
 
+from collections import defaultdict
 from django.core.exceptions import ValidationError
-from django.db import models
+from django.db import models, transaction
+from django.utils import timezone
 import uuid
 
+
+class OrderQuerySet(models.QuerySet):
+
+    # Ids per UPDATE ... WHERE id IN (...), within SQLite's variable limit
+    UPDATE_BATCH_SIZE = 500
+
+    def mark_delivered(self):
+        """
+        Deliver every NEW order in this queryset.
+
+        A status transition only: one conditional UPDATE per canteen,
+        no per-row save() / full_clean(). Counters are adjusted in the
+        same transaction and dashboards are notified after commit.
+        Returns the number of orders delivered.
+        """
+        from .utils.cards import forget_order_cards
+        from .utils.events import notify_order_ids_changed
+        from .utils.delivery import record_deliveries
+        from .utils.stats import adjust_order_counts
+
+        selected = defaultdict(list)
+        delivered = defaultdict(list)
+        order_ids = []
+        timings = []
+        total = 0
+        with transaction.atomic():
+            rows = self.filter(status='NEW').select_for_update().values_list('id', 'canteen_id')
+            for order_pk, canteen_id in rows:
+                selected[canteen_id].append(order_pk)
+            # Stamped once the rows are locked: a timestamp taken before
+            # waiting on the lock could fall behind a cursor the feed has
+            # already handed out, and the delta poll would miss it
+            now = timezone.now()
+
+            for canteen_id, ids in selected.items():
+                count = 0
+                for start in range(0, len(ids), self.UPDATE_BATCH_SIZE):
+                    batch = ids[start:start + self.UPDATE_BATCH_SIZE]
+                    if not Order.objects.filter(
+                        id__in=batch, canteen_id=canteen_id, status='NEW',
+                    ).update(status='DELIVERED', updated_at=now, delivered_at=now):
+                        continue
+                    # Only the rows this UPDATE changed: another worker may
+                    # have delivered some of the selected ones meanwhile
+                    changed = Order.objects.filter(
+                        id__in=batch, status='DELIVERED', delivered_at=now,
+                    ).values_list('id', 'order_id', 'seat__lab_id', 'item_id', 'created_at')
+                    for order_pk, order_id, lab_id, item_id, created_at in changed:
+                        delivered[canteen_id].append(order_pk)
+                        order_ids.append(order_id)
+                        timings.append((canteen_id, lab_id, item_id, created_at, now))
+                        count += 1
+                adjust_order_counts(canteen_id, new=-count, delivered=count)
+                total += count
+            record_deliveries(timings)
+
+            if delivered:
+                transaction.on_commit(lambda: forget_order_cards(order_ids, 'NEW'))
+                transaction.on_commit(lambda: notify_order_ids_changed(delivered, created=False))
+        return total
+
+
 class Order(models.Model):
 
     STATUS_CHOICES = (
@@ -162,6 +226,17 @@ class Order(models.Model):
     seat = models.ForeignKey(Seat, on_delete=models.CASCADE)
     item = models.ForeignKey(MenuItem, on_delete=models.CASCADE)
 
+    # Copied from seat.lab.canteen on create so the dashboard
+    # queries filter on one column instead of a three-table join.
+    canteen = models.ForeignKey(
+        Canteen,
+        on_delete=models.CASCADE,
+        null=True,
+        blank=True,
+        editable=False,
+        db_index=False,  # covered by the composite indexes below
+    )
+
     option = models.ForeignKey(
         ItemOption,
         on_delete=models.SET_NULL,
@@ -177,17 +252,72 @@ class Order(models.Model):
     )
 
     created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    delivered_at = models.DateTimeField(null=True, blank=True, editable=False)
+
+    objects = OrderQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            # Dashboard lists and counts: canteen + status, newest first
+            models.Index(fields=['canteen', 'status', '-created_at'], name='order_canteen_status_created'),
+            # Delta feed: orders changed since a cursor
+            models.Index(fields=['canteen', 'updated_at'], name='order_canteen_updated'),
+            # Admin date hierarchy across all canteens
+            models.Index(fields=['created_at'], name='order_created'),
+        ]
 
-    
     def clean(self):
         if self.option and self.option.menu_item != self.item:
             raise ValidationError(
                 {"option": "Selected option does not belong to the selected menu item."}
             )
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Remember the stored status so save() can tell a transition
+        instance._loaded_status = instance.__dict__.get('status')
+        return instance
+
     def save(self, *args, **kwargs):
+        from .utils.cards import forget_order_cards
+        from .utils.delivery import record_deliveries
+        from .utils.stats import record_status_change
+
+        if self.canteen_id is None and self.seat_id is not None:
+            self.canteen_id = self.seat.lab.canteen_id
         self.full_clean()  # Enforces clean() every time
-        super().save(*args, **kwargs)
+
+        old_status = None
+        if not self._state.adding:
+            old_status = getattr(self, '_loaded_status', None)
+            if old_status is None:
+                # Status was deferred (.only() / .defer()): ask the database
+                old_status = Order.objects.filter(pk=self.pk).values_list('status', flat=True).first()
+        reopened = None
+        if self.status == 'DELIVERED' and self.delivered_at is None:
+            self.delivered_at = timezone.now()
+        elif self.status != 'DELIVERED' and self.delivered_at is not None:
+            reopened, self.delivered_at = self.delivered_at, None
+
+        with transaction.atomic():
+            if old_status is not None and old_status != self.status:
+                # Claim the transition: of two saves racing to change the
+                # status, only the one that moves the row counts it
+                if not Order.objects.filter(pk=self.pk, status=old_status).update(status=self.status):
+                    old_status = Order.objects.filter(pk=self.pk).values_list('status', flat=True).first()
+            super().save(*args, **kwargs)
+            record_status_change(self.canteen_id, old_status, self.status)
+            if old_status != self.status and self.created_at:
+                lab_id = self.seat.lab_id
+                if self.status == 'DELIVERED':
+                    record_deliveries([(self.canteen_id, lab_id, self.item_id, self.created_at, self.delivered_at)])
+                elif reopened and old_status == 'DELIVERED':
+                    record_deliveries([(self.canteen_id, lab_id, self.item_id, self.created_at, reopened)], sign=-1)
+            if old_status and old_status != self.status:
+                transaction.on_commit(lambda: forget_order_cards([self.order_id], old_status))
+        self._loaded_status = self.status
 
     def __str__(self):
         return f"{self.item.name} → {self.seat}"
@@ -202,4 +332,111 @@ class CanteenManager(models.Model):
     canteen = models.ForeignKey(Canteen, on_delete=models.CASCADE)
 
     def __str__(self):
-        return f"{self.user.username} → {self.canteen.name}"
\ No newline at end of file
+        return f"{self.user.username} → {self.canteen.name}"
+
+
+# --------------------------------------------------
+# CANTEEN ORDER STATS
+# --------------------------------------------------
+# Running NEW / DELIVERED counts per canteen, kept in step
+# with Order writes in the same transaction so the dashboard
+# reads one row instead of counting the Order table.
+# Rebuild with: python manage.py rebuild_order_stats
+# --------------------------------------------------
+
+class CanteenOrderStats(models.Model):
+    canteen = models.OneToOneField(
+        Canteen,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='order_stats'
+    )
+    new_count = models.IntegerField(default=0)
+    delivered_count = models.IntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name_plural = "canteen order stats"
+
+    def __str__(self):
+        return f"Canteen #{self.canteen_id}: {self.new_count} new, {self.delivered_count} delivered"
+
+
+# --------------------------------------------------
+# ORDER ARCHIVE
+# --------------------------------------------------
+# DELIVERED orders older than ORDER_ARCHIVE_DAYS are moved
+# out of Order by `python manage.py archive_orders`, either
+# into ArchivedOrder or into compressed daily files.
+# Names are copied so the archive survives menu / seat edits.
+# OrderDailyRollup keeps per-day item counts either way.
+# --------------------------------------------------
+
+class ArchivedOrder(models.Model):
+    order_id = models.UUIDField(unique=True)
+    canteen = models.ForeignKey(
+        Canteen,
+        on_delete=models.SET_NULL,
+        null=True,
+        db_index=False,  # covered by the index below
+    )
+    canteen_name = models.CharField(max_length=100)
+    lab_name = models.CharField(max_length=100)
+    seat_number = models.CharField(max_length=20)
+    item_name = models.CharField(max_length=100)
+    option_name = models.CharField(max_length=50, blank=True)
+    status = models.CharField(max_length=10)
+    created_at = models.DateTimeField()
+    archived_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['canteen', 'created_at'], name='archived_canteen_created'),
+        ]
+
+    def __str__(self):
+        return f"{self.item_name} → {self.lab_name} - Seat {self.seat_number}"
+
+
+class OrderDailyRollup(models.Model):
+    canteen = models.ForeignKey(Canteen, on_delete=models.CASCADE)
+    day = models.DateField()
+    item_name = models.CharField(max_length=100)
+    order_count = models.IntegerField(default=0)
+
+    class Meta:
+        unique_together = ('canteen', 'day', 'item_name')
+
+    def __str__(self):
+        return f"{self.day} {self.item_name}: {self.order_count}"
+
+
+# --------------------------------------------------
+# DELIVERY TIME ROLLUPS
+# --------------------------------------------------
+# Time from order to delivery, folded in as orders are
+# delivered, per canteen / lab / item and the hour the order
+# was placed. `histogram` counts deliveries per bucket of
+# utils.delivery.DELIVERY_BUCKETS, enough to estimate median
+# and p95 without reading Order. Rebuild with:
+#   python manage.py rebuild_delivery_stats
+# --------------------------------------------------
+
+class DeliveryTimeRollup(models.Model):
+    canteen = models.ForeignKey(Canteen, on_delete=models.CASCADE)
+    lab = models.ForeignKey(Lab, on_delete=models.CASCADE)
+    item = models.ForeignKey(MenuItem, on_delete=models.CASCADE)
+    hour = models.DateTimeField()
+    order_count = models.IntegerField(default=0)
+    total_seconds = models.FloatField(default=0)
+    max_seconds = models.FloatField(default=0)
+    histogram = models.JSONField(default=list)
+
+    class Meta:
+        unique_together = ('canteen', 'lab', 'item', 'hour')
+        indexes = [
+            models.Index(fields=['canteen', 'hour'], name='delivery_canteen_hour'),
+        ]
+
+    def __str__(self):
+        return f"{self.hour:%Y-%m-%d %H:00} {self.item_id}: {self.order_count}"
@@ -0,0 +1,139 @@
+# signals.py
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from .models import Canteen, CanteenOrderStats, ItemOption, Lab, MenuItem, Order, QRCode, Seat
+from .utils.cards import bump_cards_version
+from .utils.events import notify_order_changes
+from .utils.feed import bump_canteens_version, bump_orders_version
+from .utils.locations import forget_locations
+from .utils.menu import invalidate_menu
+from .utils.publish import publish_menu
+from .utils.stats import STATUS_FIELDS
+
+
+# --------------------------------------------------
+# ORDER CHANGES
+# --------------------------------------------------
+# Bump the canteen's feed version and notify the live
+# streams once the change is committed, so nobody sees a
+# change before the rows it describes.
+# --------------------------------------------------
+
+@receiver(post_save, sender=Order)
+def order_saved(sender, instance, created, **kwargs):
+    transaction.on_commit(lambda: notify_order_changes([instance], created))
+
+
+@receiver(post_delete, sender=Order)
+def order_deleted(sender, instance, **kwargs):
+    canteen_id = instance.canteen_id
+
+    # Update only: the canteen itself may be going away in the same cascade
+    field = STATUS_FIELDS.get(instance.status)
+    if field:
+        CanteenOrderStats.objects.filter(canteen_id=canteen_id).update(**{field: F(field) - 1})
+
+    transaction.on_commit(lambda: bump_orders_version([canteen_id]))
+
+
+@receiver(post_save, sender=Canteen)
+@receiver(post_delete, sender=Canteen)
+def canteen_changed(sender, instance, **kwargs):
+    # The active manager may have changed: drop cached managed_canteen_ids()
+    transaction.on_commit(bump_canteens_version)
+
+
+# --------------------------------------------------
+# MENU CHANGES
+# --------------------------------------------------
+# Any edit to a canteen's menu drops its cached snapshot
+# (and re-renders its published page, if PUBLISH_MENUS).
+# --------------------------------------------------
+
+def _invalidate_menu_on_commit(canteen_id):
+    if canteen_id is not None:
+        transaction.on_commit(lambda: invalidate_menu(canteen_id))
+        if settings.PUBLISH_MENUS:
+            transaction.on_commit(lambda: publish_menu(canteen_id))
+
+
+@receiver(post_save, sender=Canteen)
+@receiver(post_delete, sender=Canteen)
+def canteen_menu_changed(sender, instance, **kwargs):
+    _invalidate_menu_on_commit(instance.pk)
+
+
+@receiver(post_save, sender=MenuItem)
+@receiver(post_delete, sender=MenuItem)
+def menu_item_changed(sender, instance, **kwargs):
+    _invalidate_menu_on_commit(instance.canteen_id)
+
+
+@receiver(post_save, sender=ItemOption)
+@receiver(post_delete, sender=ItemOption)
+def item_option_changed(sender, instance, **kwargs):
+    canteen_id = (
+        MenuItem.objects.filter(pk=instance.menu_item_id)
+        .values_list('canteen_id', flat=True)
+        .first()
+    )
+    # Deleted together with its item: the item's own signal covers it
+    _invalidate_menu_on_commit(canteen_id)
+
+
+# --------------------------------------------------
+# ORDER CARD CHANGES
+# --------------------------------------------------
+# Dashboard cards show the lab, seat, item and option
+# names: retire the cached cards when one changes.
+# --------------------------------------------------
+
+@receiver(post_save, sender=Lab)
+@receiver(post_save, sender=Seat)
+@receiver(post_save, sender=MenuItem)
+@receiver(post_save, sender=ItemOption)
+def card_content_changed(sender, instance, created, **kwargs):
+    if not created:
+        transaction.on_commit(bump_cards_version)
+
+
+# --------------------------------------------------
+# QR LOCATION CHANGES
+# --------------------------------------------------
+# Drop cached QR -> seat -> lab -> canteen lookups for every
+# QR under whatever changed. Deleting a Seat/Lab/Canteen
+# cascades to its QRCodes, whose own post_delete covers it.
+# --------------------------------------------------
+
+def _forget_on_commit(qr_ids):
+    qr_ids = list(qr_ids)
+    if qr_ids:
+        transaction.on_commit(lambda: forget_locations(qr_ids))
+
+
+@receiver(post_save, sender=QRCode)
+@receiver(post_delete, sender=QRCode)
+def qr_code_changed(sender, instance, **kwargs):
+    _forget_on_commit([instance.qr_id])
+
+
+@receiver(post_save, sender=Seat)
+def seat_changed(sender, instance, created, **kwargs):
+    if not created:
+        _forget_on_commit(QRCode.objects.filter(seat=instance).values_list('qr_id', flat=True))
+
+
+@receiver(post_save, sender=Lab)
+def lab_changed(sender, instance, created, **kwargs):
+    if not created:
+        _forget_on_commit(QRCode.objects.filter(seat__lab=instance).values_list('qr_id', flat=True))
+
+
+@receiver(post_save, sender=Canteen)
+def canteen_location_changed(sender, instance, created, **kwargs):
+    if not created:
+        _forget_on_commit(QRCode.objects.filter(seat__lab__canteen=instance).values_list('qr_id', flat=True))
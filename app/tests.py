@@ -1,3 +1,1232 @@
-from django.test import TestCase
+import asyncio
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+import uuid
+import zipfile
+from datetime import timedelta
+from io import BytesIO, StringIO
+from types import SimpleNamespace
+from unittest import mock
 
-# Create your tests here.
+from asgiref.sync import sync_to_async
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
+from django.core.management import CommandError, call_command
+from django.db import connection
+from django.http import HttpResponse
+from django.template.loader import render_to_string
+from django.test import Client, RequestFactory, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from .middleware import CompressionMiddleware, RequestMetricsMiddleware
+from .models import (
+    ArchivedOrder, Canteen, CanteenOrderStats, DeliveryTimeRollup, ItemOption, Lab, MenuItem, Order,
+    OrderDailyRollup, QRCode, Seat,
+)
+from .utils import locations
+from .utils.archive import read_archive_files
+from .utils.cards import CARD_KEY, get_cards_version, render_order_cards
+from .utils.delivery import DELIVERY_BUCKETS, build_delivery_report, record_deliveries, rebuild_delivery_rollups
+from .utils.events import get_broker
+from .utils.feed import get_orders_versions
+from .utils.locations import aresolve_location, resolve_location
+from .utils.menu import get_menu_snapshot
+from .utils.metrics import registry
+from .utils.orders import REQUEST_KEY, aplace_orders
+from .utils.publish import PLACEHOLDER_QR, published_menu_url
+from .utils.qr import RenderedQRCache, render_qr
+from .utils.stats import adjust_order_counts, get_manager_order_counts
+from .views import SEAT_COOKIE, SEAT_COOKIE_MAX_AGE
+
+
+def create_canteen(name="Main", manager=None, seats=1, items=("Tea",), lab_name="CC lab"):
+    """
+    A canteen with one lab, `seats` seats with QR codes and the named menu items.
+    """
+    canteen = Canteen.objects.create(name=name, active_manager=manager)
+    lab = Lab.objects.create(name=lab_name, canteen=canteen)
+    qr_codes = [
+        QRCode.objects.create(seat=Seat.objects.create(lab=lab, seat_number=str(n)))
+        for n in range(1, seats + 1)
+    ]
+    return SimpleNamespace(
+        canteen=canteen,
+        lab=lab,
+        qr_codes=qr_codes,
+        seats=[qr.seat for qr in qr_codes],
+        items=[MenuItem.objects.create(canteen=canteen, name=item) for item in items],
+    )
+
+
+class CanteenTestCase(TestCase):
+    """
+    Base for tests around one canteen "Main" managed by `manager`.
+    """
+
+    SEATS = 1
+    ITEMS = ("Tea",)
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.manager = User.objects.create_user('manager', password='pw')
+        fixture = create_canteen(manager=cls.manager, seats=cls.SEATS, items=cls.ITEMS)
+        cls.canteen, cls.lab = fixture.canteen, fixture.lab
+        cls.seats, cls.qr_codes, cls.items = fixture.seats, fixture.qr_codes, fixture.items
+        cls.seat, cls.item = cls.seats[0], cls.items[0]
+        cls.qr_id = cls.qr_codes[0].qr_id
+
+    def setUp(self):
+        cache.clear()
+        # The in-process location tier outlives cache.clear()
+        locations._local.clear()
+
+    def login(self):
+        self.client.force_login(self.manager)
+
+    def new_order(self, **fields):
+        fields.setdefault('seat', self.seat)
+        fields.setdefault('item', self.item)
+        with self.captureOnCommitCallbacks(execute=True):
+            return Order.objects.create(**fields)
+
+
+class ConcurrentOrderTests(TransactionTestCase):
+    """
+    Many seats posting to place_order at the same moment must not
+    lose orders or hit "database is locked".
+    """
+
+    THREADS = 8
+    ORDERS_PER_THREAD = 15
+
+    def setUp(self):
+        fixture = create_canteen(seats=self.THREADS)
+        self.qr_ids = [qr.qr_id for qr in fixture.qr_codes]
+        self.item = fixture.items[0]
+        self.canteen = fixture.canteen
+
+    def _place_orders(self, qr_id, errors):
+        client = Client()
+        try:
+            for _ in range(self.ORDERS_PER_THREAD):
+                response = client.post(f'/place_order/{qr_id}/', {
+                    'item_id': self.item.id,
+                    'request_id': str(uuid.uuid4()),
+                })
+                if response.status_code != 302:
+                    errors.append(response.status_code)
+        except Exception as e:
+            errors.append(e)
+        finally:
+            connection.close()
+
+    def _run_burst(self):
+        errors = []
+        threads = [
+            threading.Thread(target=self._place_orders, args=(qr_id, errors))
+            for qr_id in self.qr_ids
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        expected = self.THREADS * self.ORDERS_PER_THREAD
+        self.assertEqual(errors, [])
+        self.assertEqual(Order.objects.count(), expected)
+        self.assertEqual(CanteenOrderStats.objects.get(canteen=self.canteen).new_count, expected)
+
+    def test_journal_mode_is_wal(self):
+        with connection.cursor() as cursor:
+            cursor.execute("PRAGMA journal_mode")
+            self.assertEqual(cursor.fetchone()[0], 'wal')
+
+    def test_concurrent_orders_are_not_lost(self):
+        self._run_burst()
+
+    @override_settings(ORDER_INGEST_QUEUE=True)
+    def test_concurrent_orders_through_ingest_queue(self):
+        self._run_burst()
+
+
+class IdempotentOrderTests(CanteenTestCase):
+    """
+    Replaying a request_id returns the original orders instead of
+    placing new ones, and never another seat's orders.
+    """
+
+    SEATS = 2
+    ITEMS = ("Tea", "Coffee")
+
+    def setUp(self):
+        super().setUp()
+        self.qr_ids = [qr.qr_id for qr in self.qr_codes]
+
+    def _post_cart(self, qr_id, request_id):
+        return self.client.post(
+            f'/place_cart_order/{qr_id}/',
+            {'request_id': str(request_id), 'items': [{'item_id': item.id} for item in self.items]},
+            content_type='application/json',
+        )
+
+    def test_replay_returns_original_orders(self):
+        request_id = uuid.uuid4()
+        first = self._post_cart(self.qr_ids[0], request_id)
+        replay = self._post_cart(self.qr_ids[0], request_id)
+
+        self.assertEqual(first.status_code, 201)
+        self.assertEqual(replay.status_code, 200)
+        self.assertEqual(replay.json()['orders'], first.json()['orders'])
+        self.assertEqual(Order.objects.count(), 2)
+
+    def test_replay_after_cache_loss_hits_unique_constraint(self):
+        request_id = uuid.uuid4()
+        first = self._post_cart(self.qr_ids[0], request_id)
+        cache.clear()
+        replay = self._post_cart(self.qr_ids[0], request_id)
+
+        self.assertEqual(replay.status_code, 200)
+        self.assertEqual(replay.json()['orders'], first.json()['orders'])
+        self.assertEqual(Order.objects.count(), 2)
+
+    def test_same_request_id_from_another_seat_places_new_orders(self):
+        request_id = uuid.uuid4()
+        first = self._post_cart(self.qr_ids[0], request_id)
+        other = self._post_cart(self.qr_ids[1], request_id)
+
+        self.assertEqual(other.status_code, 201)
+        self.assertNotEqual(set(other.json()['orders']), set(first.json()['orders']))
+        self.assertEqual(Order.objects.count(), 4)
+
+
+class OrderCounterTests(CanteenTestCase):
+    """
+    CanteenOrderStats must match COUNT(*) after every kind of write.
+    """
+
+    def assertCountersMatch(self):
+        stats = CanteenOrderStats.objects.get(canteen=self.canteen)
+        orders = Order.objects.filter(canteen=self.canteen)
+        self.assertEqual(stats.new_count, orders.filter(status='NEW').count())
+        self.assertEqual(stats.delivered_count, orders.filter(status='DELIVERED').count())
+
+    def test_create_deliver_reopen_delete(self):
+        orders = [self.new_order() for _ in range(3)]
+        self.assertCountersMatch()
+
+        orders[0].status = 'DELIVERED'
+        orders[0].save()
+        self.assertCountersMatch()
+
+        Order.objects.filter(pk=orders[1].pk).mark_delivered()
+        self.assertCountersMatch()
+
+        orders[0].status = 'NEW'
+        orders[0].save()
+        self.assertCountersMatch()
+
+        orders[2].delete()
+        self.assertCountersMatch()
+
+    def test_save_with_deferred_status(self):
+        order = self.new_order()
+        deferred = Order.objects.only('id', 'seat', 'item', 'canteen').get(pk=order.pk)
+        deferred.status = 'DELIVERED'
+        deferred.save()
+        self.assertCountersMatch()
+
+    def test_racing_saves_count_one_delivery(self):
+        order = self.new_order()
+        first = Order.objects.get(pk=order.pk)
+        second = Order.objects.get(pk=order.pk)
+        for copy in (first, second):
+            copy.status = 'DELIVERED'
+            copy.save()
+        self.assertCountersMatch()
+
+    def test_mark_delivered_twice(self):
+        self.new_order()
+        self.assertEqual(Order.objects.mark_delivered(), 1)
+        self.assertEqual(Order.objects.mark_delivered(), 0)
+        self.assertCountersMatch()
+
+
+class ConditionalStatsTests(CanteenTestCase):
+    """
+    get_order_stats answers 304 while nothing it shows has changed.
+    """
+
+    def setUp(self):
+        super().setUp()
+        self.login()
+
+    def test_unchanged_stats_are_not_modified(self):
+        first = self.client.get('/get_order_stats/')
+        again = self.client.get('/get_order_stats/', HTTP_IF_NONE_MATCH=first['ETag'])
+
+        self.assertEqual(first.status_code, 200)
+        self.assertEqual(again.status_code, 304)
+
+    def test_canteen_rename_changes_etag(self):
+        first = self.client.get('/get_order_stats/')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.canteen.name = "Main block"
+            self.canteen.save()
+        again = self.client.get('/get_order_stats/', HTTP_IF_NONE_MATCH=first['ETag'])
+
+        self.assertEqual(again.status_code, 200)
+        self.assertEqual(again.json()['canteens'][0]['name'], "Main block")
+
+
+class CompressionMiddlewareTests(TestCase):
+
+    def _process(self, content_type):
+        request = RequestFactory().get('/', HTTP_ACCEPT_ENCODING='gzip')
+        body = b'x' * 1000
+        return CompressionMiddleware(lambda r: HttpResponse(body, content_type=content_type))(request)
+
+    def test_text_is_compressed(self):
+        self.assertEqual(self._process('text/html')['Content-Encoding'], 'gzip')
+
+    def test_images_are_left_alone(self):
+        self.assertFalse(self._process('image/png').has_header('Content-Encoding'))
+
+
+class DeliveredPagingTests(CanteenTestCase):
+    """
+    The today window of the DELIVERED list offers older orders only
+    when there are some.
+    """
+
+    def setUp(self):
+        super().setUp()
+        self.login()
+
+    def _delivered(self, created_at=None):
+        order = self.new_order(status='DELIVERED')
+        if created_at:
+            Order.objects.filter(pk=order.pk).update(created_at=created_at)
+
+    def test_no_older_link_without_older_orders(self):
+        self._delivered()
+        response = self.client.get('/get_new_orders/?status=DELIVERED')
+        self.assertFalse(response.has_header('X-Next-Page'))
+
+    def test_older_link_when_older_orders_exist(self):
+        self._delivered()
+        self._delivered(timezone.now() - timedelta(days=2))
+        response = self.client.get('/get_new_orders/?status=DELIVERED')
+        older = self.client.get(
+            '/get_new_orders/?status=DELIVERED&window=all&before=' + response['X-Next-Page']
+        )
+        self.assertEqual(len(older.context['cards']), 1)
+
+
+class ImportLayoutTests(TestCase):
+    """
+    import_layout creates what a layout describes, once.
+    """
+
+    LAYOUT = {'canteens': [{
+        'name': "Main",
+        'labs': [{'name': "CC lab", 'seats': "1-20, A01-A05"}],
+        'menu': [{'name': "Tea", 'options': ["Sugar", "No Sugar"]}],
+    }]}
+
+    def _import(self, layout, suffix='.json'):
+        fd, path = tempfile.mkstemp(suffix=suffix)
+        self.addCleanup(os.remove, path)
+        with os.fdopen(fd, 'w') as f:
+            f.write(layout if isinstance(layout, str) else json.dumps(layout))
+        out = StringIO()
+        call_command('import_layout', path, stdout=out)
+        return out.getvalue()
+
+    def test_rerun_creates_nothing(self):
+        first = self._import(self.LAYOUT)
+        second = self._import(self.LAYOUT)
+
+        self.assertIn("Created 1 canteens, 1 labs, 25 seats, 25 qr codes, 1 items, 2 options.", first)
+        self.assertIn("Created 0 canteens, 0 labs, 0 seats, 0 qr codes, 0 items, 0 options.", second)
+        self.assertEqual(Seat.objects.count(), 25)
+        self.assertEqual(QRCode.objects.count(), 25)
+        self.assertEqual(ItemOption.objects.count(), 2)
+        self.assertTrue(Seat.objects.filter(seat_number="A01").exists())
+
+    def test_csv_extends_existing_layout(self):
+        self._import(self.LAYOUT)
+        out = self._import("canteen,lab,seats,item,options\nMain,CC lab,1-30,Tea,Sugar|Milk\n", '.csv')
+
+        self.assertIn("Created 0 canteens, 0 labs, 10 seats, 10 qr codes, 0 items, 1 options.", out)
+
+    def test_mixed_prefix_range_is_rejected(self):
+        layout = {'canteens': [{'name': "Main", 'labs': [{'name': "CC lab", 'seats': "A1-B5"}]}]}
+        with self.assertRaises(CommandError):
+            self._import(layout)
+        self.assertFalse(Seat.objects.exists())
+
+
+class OrderFeedTests(CanteenTestCase):
+    """
+    get_new_orders: ETags for unchanged lists and cursor deltas.
+    """
+
+    def setUp(self):
+        super().setUp()
+        self.login()
+
+    def test_unchanged_list_is_not_modified(self):
+        self.new_order()
+        first = self.client.get('/get_new_orders/')
+        again = self.client.get('/get_new_orders/', HTTP_IF_NONE_MATCH=first['ETag'])
+        weak = self.client.get('/get_new_orders/', HTTP_IF_NONE_MATCH='W/' + first['ETag'])
+
+        self.assertEqual(again.status_code, 304)
+        self.assertEqual(weak.status_code, 304)
+
+    def test_new_order_changes_etag(self):
+        first = self.client.get('/get_new_orders/')
+        self.new_order()
+        again = self.client.get('/get_new_orders/', HTTP_IF_NONE_MATCH=first['ETag'])
+
+        self.assertEqual(again.status_code, 200)
+        self.assertEqual(len(again.context['cards']), 1)
+
+    def test_cursor_returns_only_changes(self):
+        self.new_order()
+        cursor = self.client.get('/get_new_orders/')['X-Orders-Cursor']
+        delivered = self.new_order()
+        with self.captureOnCommitCallbacks(execute=True):
+            delivered.status = 'DELIVERED'
+            delivered.save()
+        added = self.new_order()
+
+        delta = self.client.get('/get_new_orders/', {'since': cursor}).json()
+
+        self.assertIn(str(added.order_id), delta['html'])
+        self.assertEqual(delta['removed'], [str(delivered.order_id)])
+
+    def test_invalid_cursor_is_rejected(self):
+        self.assertEqual(self.client.get('/get_new_orders/', {'since': 'abc'}).status_code, 400)
+
+
+class CartOrderTests(CanteenTestCase):
+    """
+    place_cart_order stores a whole cart with one INSERT, or nothing.
+    """
+
+    ITEMS = ("Tea", "Coffee")
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.tea, cls.coffee = cls.items
+        cls.sugar = ItemOption.objects.create(menu_item=cls.tea, name="Sugar")
+
+    def _post(self, items):
+        return self.client.post(
+            f'/place_cart_order/{self.qr_id}/', {'items': items}, content_type='application/json',
+        )
+
+    def test_cart_is_one_insert(self):
+        items = [
+            {'item_id': self.tea.id, 'option_id': self.sugar.id},
+            {'item_id': self.tea.id},
+            {'item_id': self.coffee.id},
+        ]
+        with CaptureQueriesContext(connection) as queries:
+            response = self._post(items)
+
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(len(response.json()['orders']), 3)
+        inserts = [q for q in queries.captured_queries if q['sql'].startswith('INSERT INTO "app_order"')]
+        self.assertEqual(len(inserts), 1)
+        self.assertEqual(CanteenOrderStats.objects.get(canteen=self.canteen).new_count, 3)
+
+    def test_invalid_line_rejects_whole_cart(self):
+        self.coffee.is_available = False
+        self.coffee.save()
+        response = self._post([{'item_id': self.tea.id}, {'item_id': self.coffee.id}])
+
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(Order.objects.exists())
+
+    def test_option_of_another_item_is_rejected(self):
+        response = self._post([{'item_id': self.coffee.id, 'option_id': self.sugar.id}])
+
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(Order.objects.exists())
+
+
+class SeatCookieTests(CanteenTestCase):
+    """
+    order_success trusts the seat cookie only if it is signed by us
+    and not older than SEAT_COOKIE_MAX_AGE.
+    """
+
+    def _place_order(self):
+        return self.client.post(f'/place_order/{self.qr_id}/', {'item_id': self.item.id})
+
+    def test_order_sets_seat_cookie(self):
+        self._place_order()
+        response = self.client.get('/order_success/')
+        self.assertEqual(response.context['qr_id'], str(self.qr_id))
+
+    def test_tampered_cookie_is_ignored(self):
+        self._place_order()
+        signed = self.client.cookies[SEAT_COOKIE].value
+        self.client.cookies[SEAT_COOKIE] = str(uuid.uuid4()) + signed[len(str(self.qr_id)):]
+        response = self.client.get('/order_success/')
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn('qr_id', response.context)
+
+    def test_expired_cookie_is_ignored(self):
+        with mock.patch('django.core.signing.time.time', return_value=time.time() - SEAT_COOKIE_MAX_AGE - 60):
+            self._place_order()
+        response = self.client.get('/order_success/')
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn('qr_id', response.context)
+
+
+class ManagerCountsTests(CanteenTestCase):
+    """
+    Per-canteen NEW / DELIVERED counts for a manager, in one query.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.idle = cls.canteen
+        busy = create_canteen("Annex", manager=cls.manager)
+        foreign = create_canteen("Other", manager=User.objects.create_user('other', password='pw'))
+        cls.busy = busy.canteen
+
+        for fixture, statuses in ((busy, ['NEW', 'NEW', 'DELIVERED']), (foreign, ['NEW'])):
+            for status in statuses:
+                Order.objects.create(seat=fixture.seats[0], item=fixture.items[0], status=status)
+
+    def test_counts_per_canteen_in_one_query(self):
+        with self.assertNumQueries(1):
+            counts = get_manager_order_counts(self.manager)
+
+        self.assertEqual(counts, {
+            self.busy.id: {'name': "Annex", 'new_count': 2, 'delivered_count': 1},
+            self.idle.id: {'name': "Main", 'new_count': 0, 'delivered_count': 0},
+        })
+
+    def test_stats_endpoint_breakdown(self):
+        self.client.force_login(self.manager)
+        data = self.client.get('/get_order_stats/').json()
+
+        self.assertEqual((data['new_count'], data['delivered_count']), (2, 1))
+        self.assertEqual([c['name'] for c in data['canteens']], ["Annex", "Main"])
+
+
+class BulkDeliverTests(CanteenTestCase):
+    """
+    mark_orders_done delivers by lab or seat, only in the user's
+    canteens, and counts each order once.
+    """
+
+    SEATS = 2
+
+    def setUp(self):
+        super().setUp()
+        self.login()
+
+    def _deliver(self, **payload):
+        return self.client.post('/mark_orders_done/', payload, content_type='application/json').json()
+
+    def test_deliver_by_seat(self):
+        mine = self.new_order(seat=self.seats[0])
+        neighbour = self.new_order(seat=self.seats[1])
+
+        self.assertEqual(self._deliver(seat_id=self.seats[0].id)['delivered'], 1)
+        mine.refresh_from_db()
+        neighbour.refresh_from_db()
+        self.assertEqual((mine.status, neighbour.status), ('DELIVERED', 'NEW'))
+
+    def test_deliver_by_lab_skips_other_canteens(self):
+        for seat in self.seats:
+            self.new_order(seat=seat)
+        foreign = create_canteen("Other", manager=User.objects.create_user('other', password='pw'))
+        foreign_order = self.new_order(seat=foreign.seats[0], item=foreign.items[0])
+
+        self.assertEqual(self._deliver(lab_id=self.lab.id)['delivered'], 2)
+        self.assertEqual(self._deliver(lab_id=foreign.lab.id)['delivered'], 0)
+        foreign_order.refresh_from_db()
+        self.assertEqual(foreign_order.status, 'NEW')
+
+    def test_redelivery_is_not_counted_twice(self):
+        self.new_order()
+        self.new_order()
+
+        self.assertEqual(self._deliver(lab_id=self.lab.id)['delivered'], 2)
+        self.assertEqual(self._deliver(lab_id=self.lab.id)['delivered'], 0)
+        stats = CanteenOrderStats.objects.get(canteen=self.canteen)
+        self.assertEqual((stats.new_count, stats.delivered_count), (0, 2))
+
+
+class ArchiveOrdersTests(CanteenTestCase):
+    """
+    archive_orders moves old DELIVERED orders out of Order, keeping
+    the counters and daily rollups right.
+    """
+
+    ITEMS = ("Tea", "Coffee")
+
+    def setUp(self):
+        super().setUp()
+        self.old = timezone.now() - timedelta(days=40)
+        self.archived = [
+            self._order(status='DELIVERED', created_at=self.old, item=self.items[0]),
+            self._order(status='DELIVERED', created_at=self.old, item=self.items[0]),
+            self._order(status='DELIVERED', created_at=self.old, item=self.items[1]),
+        ]
+        self.kept = [
+            self._order(status='NEW', created_at=self.old),
+            self._order(status='DELIVERED'),
+        ]
+
+    def _order(self, created_at=None, **fields):
+        order = self.new_order(**fields)
+        if created_at:
+            Order.objects.filter(pk=order.pk).update(created_at=created_at)
+        return order
+
+    def _archive(self, *args):
+        out = StringIO()
+        with self.captureOnCommitCallbacks(execute=True):
+            call_command('archive_orders', '--days', '30', '--batch-size', '2', *args, stdout=out)
+        return out.getvalue()
+
+    def assertOnlyOldDeliveredArchived(self, tea=2):
+        self.assertEqual(
+            set(Order.objects.values_list('pk', flat=True)), {order.pk for order in self.kept}
+        )
+        stats = CanteenOrderStats.objects.get(canteen=self.canteen)
+        self.assertEqual((stats.new_count, stats.delivered_count), (1, 1))
+        rollups = dict(
+            OrderDailyRollup.objects.filter(canteen=self.canteen, day=timezone.localdate(self.old))
+            .values_list('item_name', 'order_count')
+        )
+        self.assertEqual(rollups, {"Tea": tea, "Coffee": 1})
+
+    def test_archive_to_table(self):
+        self.assertIn("3 order(s) archived", self._archive())
+
+        self.assertOnlyOldDeliveredArchived()
+        self.assertEqual(
+            set(ArchivedOrder.objects.values_list('order_id', flat=True)),
+            {order.order_id for order in self.archived},
+        )
+        self.assertEqual(ArchivedOrder.objects.filter(canteen=self.canteen, lab_name="CC lab").count(), 3)
+
+    def test_archive_to_files(self):
+        output_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, output_dir)
+        self._archive('--to', 'files', '--output-dir', output_dir)
+
+        self.assertOnlyOldDeliveredArchived()
+        self.assertFalse(ArchivedOrder.objects.exists())
+        records = list(read_archive_files(output_dir, canteen_id=self.canteen.id))
+        self.assertEqual(
+            sorted(record['order_id'] for record in records),
+            sorted(str(order.order_id) for order in self.archived),
+        )
+        self.assertEqual(sorted(record['item_name'] for record in records), ["Coffee", "Tea", "Tea"])
+        day = timezone.localdate(self.old)
+        self.assertEqual(list(read_archive_files(output_dir, start=day + timedelta(days=1))), [])
+
+    def test_archive_bumps_feed_version(self):
+        before = get_orders_versions([self.canteen.id])[self.canteen.id]
+        self._archive()
+        self.assertNotEqual(get_orders_versions([self.canteen.id])[self.canteen.id], before)
+
+    def test_legacy_order_without_canteen(self):
+        legacy = self._order(status='DELIVERED', created_at=self.old)
+        # Legacy rows were never counted: take it back out of the counters
+        Order.objects.filter(pk=legacy.pk).update(canteen=None)
+        adjust_order_counts(self.canteen.id, delivered=-1)
+
+        self._archive()
+
+        self.assertOnlyOldDeliveredArchived(tea=3)
+        self.assertEqual(ArchivedOrder.objects.get(order_id=legacy.order_id).canteen, self.canteen)
+
+
+class DeliveryTimeTests(CanteenTestCase):
+    """
+    DeliveryTimeRollup histograms, their rebuild, and the report.
+    """
+
+    def setUp(self):
+        super().setUp()
+        self.placed = timezone.now().replace(minute=0, second=0, microsecond=0)
+
+    def _record(self, durations, fixture=None, sign=1):
+        fixture = fixture or self
+        record_deliveries([
+            (fixture.canteen.id, fixture.lab.id, fixture.items[0].id, self.placed, self.placed + timedelta(seconds=s))
+            for s in durations
+        ], sign=sign)
+
+    def _report(self, group_by='item'):
+        return build_delivery_report(
+            list(Canteen.objects.values_list('id', flat=True)),
+            self.placed - timedelta(days=1), self.placed + timedelta(hours=1), group_by,
+        )
+
+    def _rollups(self):
+        return list(DeliveryTimeRollup.objects.order_by('canteen', 'lab', 'item', 'hour').values_list(
+            'canteen', 'lab', 'item', 'hour', 'order_count', 'total_seconds', 'max_seconds', 'histogram',
+        ))
+
+    def test_bucket_arithmetic(self):
+        self._record([10, 30, 31, 5000])
+
+        rollup = DeliveryTimeRollup.objects.get()
+        expected = [0] * (len(DELIVERY_BUCKETS) + 1)
+        expected[0], expected[1], expected[-1] = 2, 1, 1
+        self.assertEqual(rollup.histogram, expected)
+        self.assertEqual((rollup.order_count, rollup.total_seconds, rollup.max_seconds), (4, 5071, 5000))
+
+    def test_reopen_takes_delivery_back(self):
+        order = self.new_order()
+        order.status = 'DELIVERED'
+        order.save()
+        order.status = 'NEW'
+        order.save()
+
+        rollup = DeliveryTimeRollup.objects.get()
+        self.assertEqual((rollup.order_count, sum(rollup.histogram)), (0, 0))
+        self.assertEqual(self._report(), [])
+
+    def test_rebuild_matches_incremental_rollups(self):
+        orders = [self.new_order() for _ in range(4)]
+        Order.objects.filter(pk__in=[order.pk for order in orders[:2]]).mark_delivered()
+        orders[2].status = 'DELIVERED'
+        orders[2].save()
+        incremental = self._rollups()
+
+        self.assertEqual(rebuild_delivery_rollups(), (None, 3))
+        self.assertEqual(self._rollups(), incremental)
+
+    def test_percentiles_of_uniform_durations(self):
+        self._record(range(1, 101))
+
+        row, = self._report()
+        self.assertEqual(row['orders'], 100)
+        self.assertAlmostEqual(row['mean'], 50.5)
+        self.assertAlmostEqual(row['median'], 50)
+        # p95 falls in the 60-120s bucket; the max caps the estimate
+        self.assertTrue(95 <= row['p95'] <= 100)
+        self.assertEqual(row['max'], 100)
+
+    def test_same_names_in_other_canteens_stay_apart(self):
+        other = create_canteen("Other")
+        self._record([60])
+        self._record([600], fixture=other)
+
+        for group_by, name in (('item', "Tea"), ('lab', "CC lab")):
+            rows = self._report(group_by)
+            self.assertEqual(
+                sorted((row['canteen'], row['label'], row['orders']) for row in rows),
+                [("Main", name, 1), ("Other", name, 1)],
+            )
+        self.assertEqual(len(self._report('hour')), 1)
+
+    def test_report_shows_only_managed_canteens(self):
+        self.manager.is_staff = True
+        self.manager.save()
+        self.login()
+        other = create_canteen("Other", manager=User.objects.create_user('other', password='pw'))
+        self._record([60])
+        self._record([600], fixture=other)
+
+        rows = self.client.get('/reports/delivery/', {'by': 'lab', 'format': 'json'}).json()['rows']
+
+        self.assertEqual([(row['canteen'], row['label'], row['orders']) for row in rows], [("Main", "CC lab", 1)])
+        self.assertEqual(self.client.get('/reports/delivery/', {'by': 'lab'}).status_code, 200)
+
+
+class MenuSnapshotTests(CanteenTestCase):
+    """
+    The cached menu snapshot is served until a menu edit retires it.
+    """
+
+    def _names(self):
+        return [
+            (item['name'], [option['name'] for group in item['customizations'] for option in group['options']])
+            for item in get_menu_snapshot(self.canteen.id)['items']
+        ]
+
+    def test_warm_snapshot_skips_the_database(self):
+        self._names()
+        with self.assertNumQueries(0):
+            self.assertEqual(self._names(), [("Tea", [])])
+
+    def test_menu_item_edit_invalidates(self):
+        self._names()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.item.name = "Green tea"
+            self.item.save()
+        self.assertEqual(self._names(), [("Green tea", [])])
+
+    def test_item_option_edit_invalidates(self):
+        self._names()
+        with self.captureOnCommitCallbacks(execute=True):
+            option = ItemOption.objects.create(menu_item=self.item, name="Sugar")
+        self.assertEqual(self._names(), [("Tea", ["Sugar"])])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            option.name = "No sugar"
+            option.save()
+        self.assertEqual(self._names(), [("Tea", ["No sugar"])])
+
+
+class RenderedQRCacheTests(CanteenTestCase):
+    """
+    serve_qr_code renders each (URL, options) once, from memory or
+    disk after that, and only ever encodes SITE_URL.
+    """
+
+    def setUp(self):
+        super().setUp()
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        self.qr_cache = RenderedQRCache(directory, max_files=10)
+        patcher = mock.patch('app.views.rendered_qr_cache', self.qr_cache)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        patcher = mock.patch('app.utils.qr.render_qr', wraps=render_qr)
+        self.render = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def _get(self, **extra):
+        return self.client.get(f'/qr_image/{self.qr_id}/', **extra)
+
+    def test_memory_hit(self):
+        first = self._get()
+        second = self._get()
+
+        self.assertEqual(self.render.call_count, 1)
+        self.assertEqual(second.content, first.content)
+
+    def test_disk_hit_after_memory_is_cleared(self):
+        first = self._get()
+        self.qr_cache._memory.clear()
+        second = self._get()
+
+        self.assertEqual(self.render.call_count, 1)
+        self.assertEqual(second.content, first.content)
+
+    def test_new_url_is_rendered_again(self):
+        first = self._get()
+        with override_settings(SITE_URL="https://canteen.example.com"):
+            second = self._get()
+
+        self.assertEqual(self.render.call_count, 2)
+        self.assertNotEqual(second['ETag'], first['ETag'])
+        self.assertEqual(self.render.call_args.args[0], f"https://canteen.example.com/scan/{self.qr_id}/")
+
+    def test_host_header_is_ignored(self):
+        first = self._get()
+        second = self._get(HTTP_HOST='attacker.example.com')
+
+        self.assertEqual(self.render.call_count, 1)
+        self.assertEqual(second['ETag'], first['ETag'])
+
+    def test_disk_tier_is_capped(self):
+        for size in range(1, 16):
+            self._get(data={'size': size})
+
+        files = list(self.qr_cache._disk_files())
+        self.assertLessEqual(len(files), 10)
+        self.assertTrue(any(path.endswith('.png') for path in files))
+
+
+class LocationCacheTests(CanteenTestCase):
+    """
+    Cached QR locations are dropped as soon as the QR code or
+    anything above it changes.
+    """
+
+    def setUp(self):
+        super().setUp()
+        self.assertEqual(self._scan().status_code, 200)
+
+    def _scan(self):
+        return self.client.get(f'/scan/{self.qr_id}/')
+
+    def _order(self, item=None):
+        return self.client.post(f'/place_order/{self.qr_id}/', {'item_id': (item or self.item).id})
+
+    def assertRejected(self):
+        self.assertEqual(self._scan().status_code, 404)
+        self.assertEqual(self._order().status_code, 404)
+        self.assertFalse(Order.objects.exists())
+
+    def test_deactivated_code_is_rejected(self):
+        qr = self.qr_codes[0]
+        with self.captureOnCommitCallbacks(execute=True):
+            qr.is_active = False
+            qr.save()
+        self.assertRejected()
+
+    def _delete(self, obj):
+        with self.captureOnCommitCallbacks(execute=True):
+            obj.delete()
+        self.assertRejected()
+
+    def test_deleted_seat_is_rejected(self):
+        self._delete(Seat.objects.get(pk=self.seat.pk))
+
+    def test_deleted_lab_is_rejected(self):
+        self._delete(Lab.objects.get(pk=self.lab.pk))
+
+    def test_deleted_canteen_is_rejected(self):
+        self._delete(Canteen.objects.get(pk=self.canteen.pk))
+
+    def test_moved_seat_orders_go_to_the_new_canteen(self):
+        other = create_canteen("Other", seats=0, lab_name="Library")
+        with self.captureOnCommitCallbacks(execute=True):
+            self.seat.lab = other.lab
+            self.seat.save()
+
+        self.assertEqual(resolve_location(self.qr_id).canteen_id, other.canteen.id)
+        self.assertEqual(self._scan().status_code, 200)
+        self.assertEqual(self._order(self.item).status_code, 400)
+        self.assertEqual(self._order(other.items[0]).status_code, 302)
+        self.assertEqual(Order.objects.get().canteen, other.canteen)
+
+
+class OrderCardCacheTests(CanteenTestCase):
+    """
+    Rendered dashboard cards are reused until the order changes
+    status or something shown on the card is renamed.
+    """
+
+    def setUp(self):
+        super().setUp()
+        patcher = mock.patch('app.utils.cards.render_to_string', wraps=render_to_string)
+        self.render = patcher.start()
+        self.addCleanup(patcher.stop)
+        self.order = self.new_order()
+
+    def _cards(self):
+        orders = Order.objects.select_related('seat__lab', 'item', 'option').order_by('id')
+        return render_order_cards(list(orders))
+
+    def test_second_render_reuses_fragment(self):
+        first = self._cards()
+        second = self._cards()
+
+        self.assertEqual(self.render.call_count, 1)
+        self.assertEqual(second, first)
+
+    def test_save_forgets_old_status(self):
+        self._cards()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.order.status = 'DELIVERED'
+            self.order.save()
+        card, = self._cards()
+
+        self.assertEqual(self.render.call_count, 2)
+        self.assertIn('DELIVERED', card)
+        self.assertIsNone(cache.get(CARD_KEY.format(self.order.order_id, 'NEW', get_cards_version())))
+
+    def test_mark_delivered_forgets_old_status(self):
+        self._cards()
+        with self.captureOnCommitCallbacks(execute=True):
+            Order.objects.mark_delivered()
+
+        self.assertIsNone(cache.get(CARD_KEY.format(self.order.order_id, 'NEW', get_cards_version())))
+        self.assertIn('DELIVERED', self._cards()[0])
+
+    def test_item_rename_retires_card(self):
+        self._cards()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.item.name = "Masala tea"
+            self.item.save()
+        card, = self._cards()
+
+        self.assertEqual(self.render.call_count, 2)
+        self.assertIn("Masala tea", card)
+
+    def test_lab_rename_changes_feed_etag(self):
+        self.login()
+        first = self.client.get('/get_new_orders/')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.lab.name = "Library"
+            self.lab.save()
+        again = self.client.get('/get_new_orders/', HTTP_IF_NONE_MATCH=first['ETag'])
+
+        self.assertEqual(again.status_code, 200)
+        self.assertContains(again, "Lab: Library")
+
+
+class QRGenerationTests(CanteenTestCase):
+    """
+    Bulk QR image generation and the QRCode admin exports.
+    """
+
+    SEATS = 3
+
+    def setUp(self):
+        super().setUp()
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        overrides = override_settings(MEDIA_ROOT=media_root, PUBLISH_MENUS=False)
+        overrides.enable()
+        self.addCleanup(overrides.disable)
+
+    def _generate(self, *args):
+        out = StringIO()
+        call_command('generate_qr_codes', '--workers', '2', *args, stdout=out)
+        return out.getvalue()
+
+    def _admin_action(self, action):
+        self.client.force_login(User.objects.create_superuser('admin', password='pw'))
+        return self.client.post('/admin/app/qrcode/', {
+            'action': action,
+            '_selected_action': [qr.pk for qr in self.qr_codes],
+        }, follow=action == 'generate_qr_codes')
+
+    def test_generate_skips_current_images(self):
+        self.assertIn("3 QR image(s) generated, 0 already up to date.", self._generate())
+        self.assertIn("0 QR image(s) generated, 3 already up to date.", self._generate())
+        self.assertIn("3 QR image(s) generated, 0 already up to date.", self._generate('--force'))
+
+    def test_site_url_change_regenerates(self):
+        self._generate()
+        old_name = QRCode.objects.get(pk=self.qr_codes[0].pk).qr_image.name
+
+        with override_settings(SITE_URL="https://canteen.example.com"):
+            self.assertIn("3 QR image(s) generated", self._generate())
+        image = QRCode.objects.get(pk=self.qr_codes[0].pk).qr_image
+
+        self.assertNotEqual(image.name, old_name)
+        self.assertFalse(image.storage.exists(old_name))
+
+    def test_admin_generate_action(self):
+        response = self._admin_action('generate_qr_codes')
+
+        self.assertContains(response, "3 QR code(s) generated successfully, 0 already up to date.")
+        self.assertFalse(QRCode.objects.filter(qr_image='').exists())
+
+    def test_admin_zip_action(self):
+        response = self._admin_action('download_qr_zip')
+        archive = zipfile.ZipFile(BytesIO(b''.join(response.streaming_content)))
+
+        self.assertEqual(sorted(archive.namelist()), ["CC_lab/1.png", "CC_lab/2.png", "CC_lab/3.png"])
+        self.assertTrue(archive.read("CC_lab/1.png").startswith(b'\x89PNG'))
+
+    def test_admin_pdf_action(self):
+        response = self._admin_action('download_qr_sheet')
+
+        self.assertEqual(response['Content-Type'], 'application/pdf')
+        self.assertTrue(b''.join(response.streaming_content).startswith(b'%PDF'))
+
+
+@override_settings(REQUEST_METRICS_SAMPLE_RATE=1, REQUEST_METRICS_N_PLUS_ONE=5)
+class RequestMetricsTests(CanteenTestCase):
+    """
+    RequestMetricsMiddleware samples requests and counts their SQL;
+    /metrics/ shows the numbers to staff only.
+    """
+
+    def setUp(self):
+        super().setUp()
+        registry.reset()
+        self.login()
+
+    def test_sampled_request_is_recorded(self):
+        self.client.get('/get_order_stats/')
+
+        self.assertEqual(dict(registry.requests), {('get_order_stats', 200): 1})
+        self.assertGreater(registry.queries['get_order_stats'].sum, 0)
+        self.assertEqual(registry.latency['get_order_stats'].count, 1)
+
+    @override_settings(REQUEST_METRICS_SAMPLE_RATE=0.5)
+    def test_unsampled_request_is_skipped(self):
+        with mock.patch('app.middleware.random.random', return_value=0.9):
+            self.client.get('/get_order_stats/')
+        self.assertEqual(dict(registry.requests), {})
+
+        with mock.patch('app.middleware.random.random', return_value=0.1):
+            self.client.get('/get_order_stats/')
+        self.assertEqual(dict(registry.requests), {('get_order_stats', 200): 1})
+
+    def test_query_count_and_repeats(self):
+        def view(request):
+            for _ in range(7):
+                Order.objects.filter(seat=self.seat).exists()
+            return HttpResponse()
+
+        with self.assertLogs('app.middleware', 'WARNING'):
+            RequestMetricsMiddleware(view)(RequestFactory().get('/'))
+
+        self.assertEqual(registry.queries['unmatched'].sum, 7)
+        self.assertEqual(registry.n_plus_one['unmatched'], 1)
+
+    def test_metrics_is_staff_only(self):
+        self.assertEqual(self.client.get('/metrics/').status_code, 403)
+        self.client.logout()
+        self.assertEqual(self.client.get('/metrics/').status_code, 403)
+
+        self.client.force_login(User.objects.create_user('staff', password='pw', is_staff=True))
+        response = self.client.get('/metrics/')
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'canteen_requests_total{view="metrics",status="403"} 2')
+
+
+@override_settings(ROOT_URLCONF='project.asgi_urls', PUBLISH_MENUS=False)
+class AsyncCustomerViewTests(CanteenTestCase):
+    """
+    The async scan -> order -> success views of project/asgi_urls.py.
+    """
+
+    async def test_scan_order_success(self):
+        scan = await self.async_client.get(f'/scan/{self.qr_id}/')
+        self.assertEqual(scan.status_code, 200)
+        self.assertEqual(scan.context['location'].canteen_id, self.canteen.id)
+
+        placed = await self.async_client.post(
+            f'/place_order/{self.qr_id}/', {'item_id': self.item.id, 'request_id': str(uuid.uuid4())},
+        )
+        self.assertRedirects(placed, '/order_success/', fetch_redirect_response=False)
+
+        success = await self.async_client.get('/order_success/')
+        self.assertEqual(success.context['qr_id'], str(self.qr_id))
+        order = await Order.objects.aget()
+        self.assertEqual((order.canteen_id, order.status), (self.canteen.id, 'NEW'))
+
+    async def test_replayed_request_id_places_one_order(self):
+        data = {'item_id': self.item.id, 'request_id': str(uuid.uuid4())}
+        for _ in range(2):
+            response = await self.async_client.post(f'/place_order/{self.qr_id}/', data)
+            self.assertEqual(response.status_code, 302)
+        self.assertEqual(await Order.objects.acount(), 1)
+
+    async def test_inactive_code_is_rejected(self):
+        await QRCode.objects.filter(qr_id=self.qr_id).aupdate(is_active=False)
+        response = await self.async_client.get(f'/scan/{self.qr_id}/')
+        self.assertEqual(response.status_code, 404)
+
+    async def test_unavailable_item_is_rejected(self):
+        await MenuItem.objects.filter(pk=self.item.pk).aupdate(is_available=False)
+        response = await self.async_client.post(f'/place_order/{self.qr_id}/', {'item_id': self.item.id})
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(await Order.objects.aexists())
+
+    async def test_aplace_orders_answers_replay_from_cache(self):
+        location = await aresolve_location(self.qr_id)
+        request_id = uuid.uuid4()
+        await cache.aset(REQUEST_KEY.format(location.qr_id, request_id), ["remembered"])
+
+        self.assertEqual(await aplace_orders(location, [(self.item.id, None)], request_id), (["remembered"], False))
+        with self.assertRaises(ValidationError):
+            await aplace_orders(location, [(self.item.id + 1000, None)])
+
+
+class PublishMenuTests(CanteenTestCase):
+    """
+    publish_menus writes each canteen's menu as static files, and menu
+    edits re-render them when PUBLISH_MENUS is on.
+    """
+
+    def setUp(self):
+        super().setUp()
+        self.root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.root)
+        overrides = override_settings(MENU_PUBLISH_ROOT=self.root, PUBLISH_MENUS=True)
+        overrides.enable()
+        self.addCleanup(overrides.disable)
+        self.directory = os.path.join(self.root, str(self.canteen.id))
+
+    def _published_items(self):
+        with open(os.path.join(self.directory, 'menu.json'), encoding='utf-8') as f:
+            return [item['name'] for item in json.load(f)]
+
+    def test_command_writes_page_and_json(self):
+        out = StringIO()
+        call_command('publish_menus', stdout=out)
+
+        self.assertIn("Published 1 menu(s).", out.getvalue())
+        self.assertEqual(self._published_items(), ["Tea"])
+        with open(os.path.join(self.directory, 'index.html'), encoding='utf-8') as f:
+            self.assertIn(PLACEHOLDER_QR, f.read())
+
+    def test_menu_change_republishes(self):
+        call_command('publish_menus', stdout=StringIO())
+        with self.captureOnCommitCallbacks(execute=True):
+            MenuItem.objects.create(canteen=self.canteen, name="Coffee")
+        self.assertEqual(self._published_items(), ["Tea", "Coffee"])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.item.is_available = False
+            self.item.save()
+        self.assertEqual(self._published_items(), ["Coffee"])
+
+    def test_deleted_canteen_is_unpublished(self):
+        call_command('publish_menus', stdout=StringIO())
+        with self.captureOnCommitCallbacks(execute=True):
+            Canteen.objects.get(pk=self.canteen.pk).delete()
+        self.assertFalse(os.path.exists(self.directory))
+
+    def test_scan_redirects_to_published_page(self):
+        response = self.client.get(f'/scan/{self.qr_id}/')
+        self.assertRedirects(
+            response, published_menu_url(self.canteen.id, self.qr_id), fetch_redirect_response=False,
+        )
+
+
+class OrderStreamTests(CanteenTestCase):
+    """
+    order_stream needs ASGI; there it forwards broker events for the
+    manager's canteens as they are committed.
+    """
+
+    def test_wsgi_answers_501(self):
+        self.login()
+        self.assertEqual(self.client.get('/order_stream/').status_code, 501)
+
+    async def test_broker_delivers_saved_order(self):
+        subscription = get_broker().subscribe([self.canteen.id])
+        try:
+            order = await sync_to_async(self.new_order)()
+            event = await asyncio.wait_for(subscription.queue.get(), 5)
+        finally:
+            get_broker().unsubscribe(subscription)
+
+        self.assertEqual((event['type'], event['created'], event['order_id']), ('order', True, str(order.order_id)))
+        self.assertEqual(event['counts']['new_count'], 1)
+        self.assertIn(str(order.order_id), event['html'])
+
+    async def test_stream_sends_stats_then_orders(self):
+        await self.async_client.aforce_login(self.manager)
+        response = await self.async_client.get('/order_stream/')
+        chunks = aiter(response.streaming_content)
+        stats = await anext(chunks)
+        order = await sync_to_async(self.new_order)()
+        event = await asyncio.wait_for(anext(chunks), 5)
+
+        # A client disconnect cancels the pending read, which unsubscribes
+        pending = asyncio.ensure_future(anext(chunks))
+        await asyncio.sleep(0)
+        pending.cancel()
+        with self.assertRaises(asyncio.CancelledError):
+            await pending
+
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        self.assertTrue(stats.startswith(b'event: stats'))
+        self.assertTrue(event.startswith(b'event: order'))
+        self.assertIn(str(order.order_id).encode(), event)
+        self.assertFalse(get_broker().has_subscribers(self.canteen.id))
@@ -7,11 +7,17 @@ urlpatterns = [
     path('', views.dashboard, name='dashboard'),
     path('get_new_orders/', views.get_new_orders, name='get_new_orders'),
     path('get_order_stats/', views.get_order_stats, name='get_order_stats'),
+    path('order_stream/', views.order_stream, name='order_stream'),
     path('mark_order_done/<uuid:order_id>/', views.mark_order_done, name='mark_order_done'),
+    path('mark_orders_done/', views.mark_orders_done, name='mark_orders_done'),
     path('scan/<uuid:qr_id>/', views.scan_qr, name='scan_qr'),
+    path('seat_context/<uuid:qr_id>/', views.seat_context, name='seat_context'),
     path('place_order/<uuid:qr_id>/', views.place_order, name='place_order'),
+    path('place_cart_order/<uuid:qr_id>/', views.place_cart_order, name='place_cart_order'),
     path('order_success/', views.order_success, name='order_success'),
     path('qr_image/<uuid:qr_id>/', views.serve_qr_code, name='serve_qr_code'),
+    path('metrics/', views.metrics, name='metrics'),
+    path('reports/delivery/', views.delivery_report, name='delivery_report'),
 ]
 
 if settings.DEBUG:
@@ -0,0 +1,161 @@
+# utils/archive.py
+import gzip
+import json
+import os
+import time
+from collections import Counter, defaultdict
+from datetime import date
+
+from django.db import transaction
+from django.db.models import Count, F, OuterRef, Subquery
+from django.utils import timezone
+
+from ..models import ArchivedOrder, Order, OrderDailyRollup, Seat
+from .stats import adjust_order_counts
+
+# --------------------------------------------------
+# ORDER ARCHIVAL
+# --------------------------------------------------
+# Moves old DELIVERED orders out of the live table in small
+# batches. Each batch is its own short transaction, so order
+# inserts only ever wait for one batch.
+#
+# Destinations:
+#   table  ArchivedOrder rows (queryable with the ORM / admin)
+#   files  <dir>/<canteen_id>/<YYYY-MM-DD>.jsonl.gz, one JSON
+#          object per order (read back with read_archive_files)
+# --------------------------------------------------
+
+
+def _archive_record(order):
+    seat = order.seat
+    return {
+        'order_id': str(order.order_id),
+        'canteen_id': order.canteen_id,
+        'canteen_name': seat.lab.canteen.name,
+        'lab_name': seat.lab.name,
+        'seat_number': seat.seat_number,
+        'item_name': order.item.name,
+        'option_name': order.option.name if order.option else '',
+        'status': order.status,
+        'created_at': timezone.localtime(order.created_at).isoformat(),
+    }
+
+
+def _write_files(records, output_dir):
+    by_file = defaultdict(list)
+    for record in records:
+        day = record['created_at'][:10]
+        by_file[os.path.join(output_dir, str(record['canteen_id']), f"{day}.jsonl.gz")].append(record)
+
+    for path, rows in by_file.items():
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Appending adds a gzip member; readers see one stream
+        with gzip.open(path, 'at', encoding='utf-8') as f:
+            for row in rows:
+                f.write(json.dumps(row) + "\n")
+
+
+def _add_to_rollups(orders):
+    counts = Counter(
+        (order.canteen_id, timezone.localdate(order.created_at), order.item.name)
+        for order in orders
+    )
+    for (canteen_id, day, item_name), total in counts.items():
+        updated = OrderDailyRollup.objects.filter(
+            canteen_id=canteen_id, day=day, item_name=item_name
+        ).update(order_count=F('order_count') + total)
+        if not updated:
+            OrderDailyRollup.objects.create(
+                canteen_id=canteen_id, day=day, item_name=item_name, order_count=total
+            )
+
+
+def _backfill_canteens(orders):
+    """
+    Give legacy orders without a canteen their seat's canteen, and
+    count them in, so rollups and delete signals see a canteen.
+    """
+    with transaction.atomic():
+        legacy = orders.filter(canteen__isnull=True)
+        per_canteen = dict(
+            legacy.values_list('seat__lab__canteen_id').annotate(n=Count('id')).order_by()
+        )
+        legacy.update(canteen_id=Subquery(
+            Seat.objects.filter(pk=OuterRef('seat_id')).values('lab__canteen_id')[:1]
+        ))
+        for canteen_id, total in per_canteen.items():
+            adjust_order_counts(canteen_id, delivered=total)
+
+
+def archive_delivered_orders(cutoff, batch_size=500, output_dir=None, pause=0, dry_run=False):
+    """
+    Archive DELIVERED orders created before `cutoff`.
+    Writes to files under `output_dir` when given, else to ArchivedOrder.
+    Returns the number of orders archived (or that would be, on dry_run).
+    """
+    candidates = Order.objects.filter(status='DELIVERED', created_at__lt=cutoff)
+    if dry_run:
+        return candidates.count()
+
+    _backfill_canteens(candidates)
+
+    archived = 0
+    while True:
+        with transaction.atomic():
+            batch = list(
+                candidates
+                .select_related('seat__lab__canteen', 'item', 'option')
+                .order_by('id')[:batch_size]
+            )
+            if not batch:
+                break
+
+            records = [_archive_record(order) for order in batch]
+            if output_dir:
+                # Written before the delete; a failed batch is retried
+                # and readers drop duplicate order_ids.
+                _write_files(records, output_dir)
+            else:
+                ArchivedOrder.objects.bulk_create(
+                    [
+                        ArchivedOrder(**{**record, 'created_at': order.created_at})
+                        for order, record in zip(batch, records)
+                    ],
+                    ignore_conflicts=True,
+                )
+            _add_to_rollups(batch)
+
+            # A plain delete: Order's post_delete signal adjusts the
+            # counters and bumps the feed versions
+            Order.objects.filter(id__in=[order.id for order in batch]).delete()
+
+        archived += len(batch)
+        if pause:
+            time.sleep(pause)
+    return archived
+
+
+def read_archive_files(output_dir, canteen_id=None, start=None, end=None):
+    """
+    Yield archived order dicts from the daily files, optionally limited
+    to one canteen and to days in [start, end] (datetime.date).
+    """
+    seen = set()
+    canteen_dirs = [str(canteen_id)] if canteen_id is not None else sorted(os.listdir(output_dir))
+    for canteen_dir in canteen_dirs:
+        directory = os.path.join(output_dir, canteen_dir)
+        if not os.path.isdir(directory):
+            continue
+        for name in sorted(os.listdir(directory)):
+            if not name.endswith('.jsonl.gz'):
+                continue
+            day = date.fromisoformat(name[:10])
+            if (start and day < start) or (end and day > end):
+                continue
+            with gzip.open(os.path.join(directory, name), 'rt', encoding='utf-8') as f:
+                for line in f:
+                    record = json.loads(line)
+                    if record['order_id'] not in seen:
+                        seen.add(record['order_id'])
+                        yield record
@@ -0,0 +1,78 @@
+# utils/cards.py
+import time
+
+from django.core.cache import cache
+from django.template.loader import render_to_string
+from django.utils.safestring import mark_safe
+
+# --------------------------------------------------
+# ORDER CARD FRAGMENTS
+# --------------------------------------------------
+# A dashboard card only changes when its order changes
+# status, so the rendered <li> is cached per
+# (order_id, status). A poll renders just the cards it has
+# not seen before; the rest come from one get_many.
+# mark_delivered() / Order.save() drop the old status's
+# fragment once the change is committed. Keys also carry a
+# version that signals bump when a lab, seat, item or
+# option changes, which retires every card showing it.
+# --------------------------------------------------
+
+CARD_TEMPLATE = 'adminDash/order_card_partial.html'
+CARD_KEY = "order_card:{}:{}:{}"
+VERSION_KEY = "order_cards_version"
+
+# Cards are re-rendered at least this often (seconds), in case
+# a change slipped past the signals (e.g. a raw SQL edit)
+CARD_TIMEOUT = 60 * 60
+
+
+def get_cards_version():
+    version = cache.get(VERSION_KEY)
+    if version is None:
+        cache.add(VERSION_KEY, time.time_ns(), timeout=None)
+        version = cache.get(VERSION_KEY)
+    return version
+
+
+def bump_cards_version():
+    """
+    Retire every cached card, after a change to what cards show.
+    """
+    try:
+        cache.incr(VERSION_KEY)
+    except ValueError:
+        cache.add(VERSION_KEY, time.time_ns(), timeout=None)
+
+
+def _card_key(order_id, status, version):
+    return CARD_KEY.format(order_id, status, version)
+
+
+def render_order_cards(orders):
+    """
+    Rendered card HTML for each order, in order.
+    """
+    version = get_cards_version()
+    keys = [_card_key(order.order_id, order.status, version) for order in orders]
+    cached = cache.get_many(keys)
+
+    missing = {}
+    cards = []
+    for order, key in zip(orders, keys):
+        html = cached.get(key)
+        if html is None:
+            html = missing[key] = render_to_string(CARD_TEMPLATE, {'order': order})
+        cards.append(mark_safe(html))
+
+    if missing:
+        cache.set_many(missing, CARD_TIMEOUT)
+    return cards
+
+
+def forget_order_cards(order_ids, status):
+    """
+    Drop the cached cards of the given orders for `status`.
+    """
+    version = get_cards_version()
+    cache.delete_many([_card_key(order_id, status, version) for order_id in order_ids])
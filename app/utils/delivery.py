@@ -0,0 +1,190 @@
+# utils/delivery.py
+from bisect import bisect_left
+from collections import defaultdict
+from datetime import timedelta
+
+from django.db import transaction
+from django.db.models import Min
+
+from ..models import DeliveryTimeRollup, Order, OrderDailyRollup
+
+# --------------------------------------------------
+# DELIVERY TIMES
+# --------------------------------------------------
+# Order -> delivery durations are folded into
+# DeliveryTimeRollup by every path that delivers an order
+# (mark_delivered, Order.save), in the same transaction.
+# Reports read the rollups only.
+# --------------------------------------------------
+
+# Upper bounds (seconds) of the histogram buckets; one more
+# bucket catches everything slower
+DELIVERY_BUCKETS = (30, 60, 120, 180, 300, 450, 600, 900, 1200, 1800, 2700, 3600)
+
+# by -> (field grouped on, field shown). Items and labs are grouped
+# by id, so same-named ones of different canteens stay apart.
+REPORT_GROUPS = {
+    'item': ('item_id', 'item__name'),
+    'lab': ('lab_id', 'lab__name'),
+    'hour': ('hour', 'hour'),
+}
+
+
+def _empty_histogram():
+    return [0] * (len(DELIVERY_BUCKETS) + 1)
+
+
+def _hour(dt):
+    return dt.replace(minute=0, second=0, microsecond=0)
+
+
+def record_deliveries(deliveries, sign=1):
+    """
+    Fold delivered orders into the rollups. `deliveries` are
+    (canteen_id, lab_id, item_id, created_at, delivered_at) tuples;
+    sign=-1 takes them back out (an order reopened).
+    Call inside the transaction that changed the orders.
+    """
+    groups = defaultdict(list)
+    for canteen_id, lab_id, item_id, created_at, delivered_at in deliveries:
+        seconds = max((delivered_at - created_at).total_seconds(), 0)
+        groups[(canteen_id, lab_id, item_id, _hour(created_at))].append(seconds)
+
+    for (canteen_id, lab_id, item_id, hour), durations in groups.items():
+        rollup, _ = DeliveryTimeRollup.objects.select_for_update().get_or_create(
+            canteen_id=canteen_id, lab_id=lab_id, item_id=item_id, hour=hour
+        )
+        histogram = rollup.histogram or _empty_histogram()
+        for seconds in durations:
+            histogram[bisect_left(DELIVERY_BUCKETS, seconds)] += sign
+        rollup.histogram = histogram
+        rollup.order_count += sign * len(durations)
+        rollup.total_seconds += sign * sum(durations)
+        if sign > 0:
+            rollup.max_seconds = max(rollup.max_seconds, *durations)
+        rollup.save(update_fields=['histogram', 'order_count', 'total_seconds', 'max_seconds'])
+
+
+def histogram_percentile(histogram, fraction, max_seconds):
+    """
+    Estimate a percentile (fraction in 0-1) from bucket counts,
+    interpolating linearly inside the bucket it falls in.
+    """
+    total = sum(histogram)
+    if not total:
+        return None
+    rank = fraction * total
+    seen = 0
+    lower = 0
+    for index, count in enumerate(histogram):
+        upper = DELIVERY_BUCKETS[index] if index < len(DELIVERY_BUCKETS) else max(max_seconds, lower)
+        if count and seen + count >= rank:
+            return min(lower + (upper - lower) * (rank - seen) / count, max_seconds)
+        seen += count
+        lower = upper
+    return max_seconds
+
+
+def build_delivery_report(canteen_ids, start, end, group_by='item'):
+    """
+    Delivery time per item, lab or hour for orders placed in [start, end).
+    Returns rows of {'key', 'label', 'canteen', 'orders', 'mean',
+    'median', 'p95', 'max'} (seconds), slowest p95 first. `canteen`
+    is the canteen name, or None for hours (all canteens together).
+    """
+    key_field, label_field = REPORT_GROUPS[group_by]
+    rows = DeliveryTimeRollup.objects.filter(
+        canteen_id__in=canteen_ids, hour__gte=_hour(start), hour__lt=end,
+    ).values_list(
+        key_field, label_field, 'canteen_id', 'canteen__name',
+        'order_count', 'total_seconds', 'max_seconds', 'histogram',
+    )
+
+    merged = {}
+    for key, label, canteen_id, canteen_name, count, total, longest, histogram in rows:
+        if group_by == 'hour':
+            canteen_id = canteen_name = None
+        entry = merged.setdefault((canteen_id, key), {
+            'key': key, 'label': label, 'canteen': canteen_name,
+            'orders': 0, 'total': 0.0, 'max': 0.0, 'histogram': _empty_histogram(),
+        })
+        entry['orders'] += count
+        entry['total'] += total
+        entry['max'] = max(entry['max'], longest)
+        for index, n in enumerate(histogram):
+            entry['histogram'][index] += n
+
+    report = []
+    for entry in merged.values():
+        if entry['orders'] <= 0:
+            continue
+        report.append({
+            'key': entry['key'],
+            'label': entry['label'],
+            'canteen': entry['canteen'],
+            'orders': entry['orders'],
+            'mean': entry['total'] / entry['orders'],
+            'median': histogram_percentile(entry['histogram'], 0.5, entry['max']),
+            'p95': histogram_percentile(entry['histogram'], 0.95, entry['max']),
+            'max': entry['max'],
+        })
+    if group_by == 'hour':
+        report.sort(key=lambda row: row['key'])
+    else:
+        report.sort(key=lambda row: row['p95'], reverse=True)
+    return report
+
+
+def default_rebuild_start():
+    """
+    Earliest hour rebuild_delivery_rollups() can recompute without
+    losing data. Once archive_orders has run, older hours only exist
+    in the rollups, and the oldest live hour may be part-archived, so
+    the rebuild starts the hour after it. None means "everything".
+    """
+    if not OrderDailyRollup.objects.exists():
+        return None
+    oldest = Order.objects.filter(status='DELIVERED').aggregate(oldest=Min('created_at'))['oldest']
+    if oldest is None:
+        return False
+    return _hour(oldest) + timedelta(hours=1)
+
+
+def rebuild_delivery_rollups(batch_size=2000, since=None):
+    """
+    Recompute the rollups of the hours from `since` (default:
+    default_rebuild_start()) from the delivered orders in Order.
+    Rollups of earlier hours are kept.
+    Returns (the start hour or None for all, orders folded in),
+    or (False, 0) when there is nothing safe to rebuild.
+    """
+    if since is None:
+        since = default_rebuild_start()
+        if since is False:
+            return False, 0
+    else:
+        since = _hour(since)
+
+    delivered = Order.objects.filter(status='DELIVERED', delivered_at__isnull=False)
+    rollups = DeliveryTimeRollup.objects.all()
+    if since is not None:
+        delivered = delivered.filter(created_at__gte=since)
+        rollups = rollups.filter(hour__gte=since)
+    delivered = delivered.values_list(
+        'canteen_id', 'seat__lab_id', 'item_id', 'created_at', 'delivered_at'
+    ).order_by('id')
+
+    folded = 0
+    with transaction.atomic():
+        rollups.delete()
+        batch = []
+        for row in delivered.iterator(chunk_size=batch_size):
+            batch.append(row)
+            if len(batch) >= batch_size:
+                record_deliveries(batch)
+                folded += len(batch)
+                batch = []
+        if batch:
+            record_deliveries(batch)
+            folded += len(batch)
+    return since, folded
@@ -0,0 +1,150 @@
+# utils/events.py
+import asyncio
+import threading
+from collections import defaultdict
+
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+from .cards import render_order_cards
+from .feed import bump_orders_version
+from .stats import get_order_counts
+
+# --------------------------------------------------
+# ORDER EVENTS
+# --------------------------------------------------
+# Fan-out of order changes to the dashboard streams.
+# place_order / mark_order_done publish once the row is
+# committed; every open stream for that canteen gets a copy.
+#
+# The broker class is picked by settings.ORDER_EVENT_BROKER.
+# The default keeps subscribers in this process, which is
+# enough when the site runs as a single ASGI process.
+# --------------------------------------------------
+
+# Events a slow stream may fall behind by before it is told to resync.
+QUEUE_SIZE = 100
+
+
+class Subscription:
+    def __init__(self, canteen_ids):
+        self.canteen_ids = set(canteen_ids)
+        self.loop = asyncio.get_running_loop()
+        self.queue = asyncio.Queue(maxsize=QUEUE_SIZE)
+
+    def deliver(self, event):
+        # Runs on the subscriber's event loop
+        try:
+            self.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            # Drop the backlog; the client refetches everything.
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            self.queue.put_nowait({'type': 'resync'})
+
+
+class InProcessBroker:
+    """
+    Keeps subscriptions in memory and hands events to each
+    subscriber's event loop. Safe to publish from any thread.
+    """
+
+    def __init__(self):
+        self._subscribers = defaultdict(set)
+        self._lock = threading.Lock()
+
+    def subscribe(self, canteen_ids):
+        subscription = Subscription(canteen_ids)
+        with self._lock:
+            for canteen_id in subscription.canteen_ids:
+                self._subscribers[canteen_id].add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            for canteen_id in subscription.canteen_ids:
+                self._subscribers[canteen_id].discard(subscription)
+                if not self._subscribers[canteen_id]:
+                    del self._subscribers[canteen_id]
+
+    def has_subscribers(self, canteen_id):
+        return canteen_id in self._subscribers
+
+    def publish(self, canteen_id, event):
+        with self._lock:
+            subscriptions = list(self._subscribers.get(canteen_id, ()))
+        for subscription in subscriptions:
+            try:
+                subscription.loop.call_soon_threadsafe(subscription.deliver, event)
+            except RuntimeError:
+                # Loop already closed; the stream is going away.
+                pass
+
+
+_broker = None
+_broker_lock = threading.Lock()
+
+
+def get_broker():
+    global _broker
+    if _broker is None:
+        with _broker_lock:
+            if _broker is None:
+                path = getattr(settings, 'ORDER_EVENT_BROKER', 'app.utils.events.InProcessBroker')
+                _broker = import_string(path)()
+    return _broker
+
+
+def publish_order_event(order, created, counts=None):
+    """
+    Push a new or changed order to the streams watching its canteen.
+    The card HTML is rendered once here, not per subscriber.
+    """
+    broker = get_broker()
+    canteen_id = order.canteen_id
+    if not broker.has_subscribers(canteen_id):
+        return
+    if counts is None:
+        counts = get_order_counts([canteen_id])[canteen_id]
+
+    broker.publish(canteen_id, {
+        'type': 'order',
+        'created': created,
+        'canteen_id': canteen_id,
+        'order_id': str(order.order_id),
+        'status': order.status,
+        'html': render_order_cards([order])[0],
+        'counts': counts,
+    })
+
+
+def notify_order_changes(orders, created):
+    """
+    Bump the feed versions and publish events for orders that were
+    just committed. Call from transaction.on_commit().
+    """
+    bump_orders_version({order.canteen_id for order in orders})
+    for order in orders:
+        publish_order_event(order, created)
+
+
+def notify_order_ids_changed(order_ids_by_canteen, created):
+    """
+    Like notify_order_changes() for set-based writes that only know
+    ids: {canteen_id: [order pk, ...]}. Orders are loaded (one query)
+    only for canteens someone is streaming.
+    """
+    from ..models import Order
+
+    bump_orders_version(order_ids_by_canteen)
+
+    broker = get_broker()
+    watched = [cid for cid in order_ids_by_canteen if broker.has_subscribers(cid)]
+    if not watched:
+        return
+
+    counts = get_order_counts(watched)
+    ids = [pk for cid in watched for pk in order_ids_by_canteen[cid]]
+    orders = Order.objects.filter(id__in=ids).select_related('seat__lab', 'item', 'option')
+    for order in orders:
+        publish_order_event(order, created, counts[order.canteen_id])
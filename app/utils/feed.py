@@ -0,0 +1,185 @@
+# utils/feed.py
+import hashlib
+import time
+from datetime import datetime, timedelta, timezone
+
+from django.core.cache import cache
+from django.db.models import Q
+
+from ..models import Canteen
+
+# --------------------------------------------------
+# ORDER FEED HELPERS
+# --------------------------------------------------
+# Every canteen has a change version kept in the cache.
+# It is bumped whenever one of its orders is created or
+# changes status, so the dashboard can answer a poll with
+# 304 Not Modified without touching the Order table.
+# --------------------------------------------------
+
+VERSION_KEY = "orders_version:{}"
+
+# Orders are fetched again from slightly before the cursor so a
+# transaction that committed late is never skipped. The client
+# replaces cards by id, so the overlap is harmless.
+CURSOR_OVERLAP = timedelta(seconds=2)
+
+
+def _version_key(canteen_id):
+    return VERSION_KEY.format(canteen_id)
+
+
+def bump_orders_version(canteen_ids):
+    """
+    Mark the order list of the given canteens as changed.
+    """
+    for canteen_id in set(canteen_ids):
+        key = _version_key(canteen_id)
+        try:
+            cache.incr(key)
+        except ValueError:
+            # Missing or evicted: restart from the clock so the new
+            # value can never collide with one handed out earlier.
+            cache.add(key, time.time_ns(), timeout=None)
+
+
+def get_orders_versions(canteen_ids):
+    """
+    Return {canteen_id: version} for the given canteens.
+    """
+    keys = {_version_key(cid): cid for cid in canteen_ids}
+    found = cache.get_many(keys.keys())
+    missing = {key: time.time_ns() for key in keys if key not in found}
+    for key, value in missing.items():
+        cache.add(key, value, timeout=None)
+    if missing:
+        found.update(cache.get_many(missing.keys()))
+    return {keys[key]: found.get(key, 0) for key in keys}
+
+
+def orders_etag(canteen_ids, *parts):
+    """
+    Strong ETag for an order list, built from the canteen versions
+    and whatever request parameters shape the response.
+    """
+    versions = get_orders_versions(canteen_ids)
+    raw = "|".join(
+        [f"{cid}:{versions[cid]}" for cid in sorted(versions)] + [str(p) for p in parts]
+    )
+    return '"%s"' % hashlib.sha1(raw.encode()).hexdigest()
+
+
+def etag_matches(request, etag):
+    header = request.headers.get("If-None-Match", "")
+    # Weak comparison: the compression middleware hands our ETags
+    # out as W/"..." and clients send them back that way
+    return etag in [tag.strip().removeprefix("W/") for tag in header.split(",")]
+
+
+# --------------------------------------------------
+# MANAGED CANTEENS
+# --------------------------------------------------
+# The canteen ids a manager sees, cached under a global
+# canteens version that signals bump on any Canteen change,
+# so an order poll can answer 304 without a query.
+# --------------------------------------------------
+
+CANTEENS_VERSION_KEY = "canteens_version"
+MANAGED_KEY = "managed_canteens:{}:{}"
+MANAGED_TIMEOUT = 60 * 60
+
+
+def bump_canteens_version():
+    try:
+        cache.incr(CANTEENS_VERSION_KEY)
+    except ValueError:
+        cache.add(CANTEENS_VERSION_KEY, time.time_ns(), timeout=None)
+
+
+def get_canteens_version():
+    version = cache.get(CANTEENS_VERSION_KEY)
+    if version is None:
+        cache.add(CANTEENS_VERSION_KEY, time.time_ns(), timeout=None)
+        version = cache.get(CANTEENS_VERSION_KEY)
+    return version
+
+
+def managed_canteen_ids(user):
+    """
+    Ids of the canteens `user` is the active manager of.
+    """
+    key = MANAGED_KEY.format(user.pk, get_canteens_version())
+    canteen_ids = cache.get(key)
+    if canteen_ids is None:
+        canteen_ids = list(Canteen.objects.filter(active_manager=user).values_list('id', flat=True))
+        cache.set(key, canteen_ids, MANAGED_TIMEOUT)
+    return canteen_ids
+
+
+# --------------------------------------------------
+# CURSORS
+# --------------------------------------------------
+# A cursor is the updated_at of the newest order the client
+# has seen, as integer microseconds since the epoch.
+# --------------------------------------------------
+
+EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+MICROSECOND = timedelta(microseconds=1)
+
+
+def encode_cursor(dt):
+    # Integer arithmetic: a float timestamp loses the last microsecond
+    return str((dt - EPOCH) // MICROSECOND)
+
+
+def decode_cursor(value):
+    """
+    Return the datetime for a cursor string, or None if it is invalid.
+    """
+    try:
+        micros = int(value)
+    except (TypeError, ValueError):
+        return None
+    try:
+        return EPOCH + micros * MICROSECOND
+    except OverflowError:
+        return None
+
+
+def changed_since(queryset, cursor_dt):
+    """
+    Orders in `queryset` touched at or after the cursor (with overlap).
+    """
+    return queryset.filter(updated_at__gte=cursor_dt - CURSOR_OVERLAP)
+
+
+# --------------------------------------------------
+# PAGE CURSORS
+# --------------------------------------------------
+# Keyset pagination over (created_at, id), newest first.
+# A page cursor is "<created_at micros>.<id>" of the last
+# order on the previous page.
+# --------------------------------------------------
+
+def encode_page_cursor(order):
+    return f"{encode_cursor(order.created_at)}.{order.id}"
+
+
+def decode_page_cursor(value):
+    """
+    Return (created_at, id) for a page cursor, or None if it is invalid.
+    """
+    created, _, order_pk = (value or '').partition('.')
+    created_at = decode_cursor(created)
+    if created_at is None or not order_pk.isdigit():
+        return None
+    return created_at, int(order_pk)
+
+
+def after_page_cursor(queryset, created_at, order_pk):
+    """
+    Orders that come after the cursor in (-created_at, -id) order.
+    """
+    return queryset.filter(
+        Q(created_at__lt=created_at) | Q(created_at=created_at, id__lt=order_pk)
+    )
@@ -0,0 +1,99 @@
+# utils/ingest.py
+import queue
+import threading
+from concurrent.futures import Future
+
+from django.db import close_old_connections, connection, transaction
+
+# --------------------------------------------------
+# SINGLE-WRITER ORDER INGESTION
+# --------------------------------------------------
+# Optional (settings.ORDER_INGEST_QUEUE). Request threads
+# hand their cart to one writer thread and wait for the
+# result. The writer drains whatever is queued and commits
+# it as one transaction, each cart in its own savepoint, so
+# a lunch-time burst costs one commit per batch instead of
+# one per order and request threads never fight over the
+# SQLite write lock.
+# --------------------------------------------------
+
+
+class OrderIngestQueue:
+
+    def __init__(self, max_batch=100, max_wait=0.005):
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self._queue = queue.Queue()
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def _ensure_started(self):
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(
+                    target=self._run, name='order-ingest', daemon=True
+                )
+                self._thread.start()
+
+    def submit(self, location, lines, request_id=None):
+        """
+        Queue a cart; returns a Future resolving to create_orders()'s result.
+        """
+        self._ensure_started()
+        future = Future()
+        self._queue.put((future, location, lines, request_id))
+        return future
+
+    def _next_batch(self):
+        batch = [self._queue.get()]
+        while len(batch) < self.max_batch:
+            try:
+                batch.append(self._queue.get(timeout=self.max_wait))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        from .orders import create_orders
+
+        while True:
+            batch = self._next_batch()
+            close_old_connections()
+            results = []
+            try:
+                with transaction.atomic():
+                    for future, location, lines, request_id in batch:
+                        # create_orders() runs in its own savepoint
+                        try:
+                            results.append((future, create_orders(location, lines, request_id), None))
+                        except Exception as e:
+                            results.append((future, None, e))
+            except Exception as e:
+                # The group commit itself failed: nothing was written
+                for future, *_ in batch:
+                    future.set_exception(e)
+                connection.close()
+                continue
+
+            for future, result, error in results:
+                if error is not None:
+                    future.set_exception(error)
+                else:
+                    future.set_result(result)
+
+            if self._queue.empty():
+                # Idle: don't hold the database open between bursts
+                connection.close()
+
+
+_ingest_queue = None
+_ingest_lock = threading.Lock()
+
+
+def get_ingest_queue():
+    global _ingest_queue
+    if _ingest_queue is None:
+        with _ingest_lock:
+            if _ingest_queue is None:
+                _ingest_queue = OrderIngestQueue()
+    return _ingest_queue
@@ -0,0 +1,203 @@
+# utils/layout.py
+import csv
+import json
+import re
+from collections import Counter
+
+from django.conf import settings
+from django.db import transaction
+
+from ..models import Canteen, ItemOption, Lab, MenuItem, QRCode, Seat
+from .menu import invalidate_menu
+from .publish import publish_menu
+
+# --------------------------------------------------
+# LAYOUT IMPORT
+# --------------------------------------------------
+# Creates canteens, labs, seats (with their QR rows), menu
+# items and options from a layout file, in one transaction.
+# Everything is matched by name, so re-running a layout only
+# adds what is missing; existing rows are left as they are.
+#
+# JSON:
+#   {"canteens": [{
+#       "name": "Main",
+#       "labs": [{"name": "CC lab", "seats": "1-40, A1-A10"}],
+#       "menu": [{"name": "Tea", "options": ["Sugar", "No Sugar"]}]
+#   }]}
+#
+# CSV, one lab and/or one menu item per row (header required):
+#   canteen,lab,seats,item,options
+#   Main,CC lab,1-40,Tea,Sugar|No Sugar
+# --------------------------------------------------
+
+SEAT_RANGE = re.compile(r"^(?P<prefix>.*?)(?P<start>\d+)\s*-\s*(?P=prefix)(?P<end>\d+)$")
+# Anything that looks like a range but failed SEAT_RANGE, e.g. "A1-B5"
+ANY_RANGE = re.compile(r"^.*?\d+\s*-\s*.*?\d+$")
+
+
+class LayoutError(ValueError):
+    pass
+
+
+def parse_seat_numbers(spec):
+    """
+    Expand "1-40, A1-A10, 99" into seat numbers. Zero padding
+    on the range start is kept ("01-12" -> "01" ... "12").
+    """
+    if isinstance(spec, (list, tuple)):
+        return [number for part in spec for number in parse_seat_numbers(part)]
+
+    numbers = []
+    for part in str(spec).split(','):
+        part = part.strip()
+        if not part:
+            continue
+        match = SEAT_RANGE.match(part)
+        if not match:
+            if ANY_RANGE.match(part):
+                raise LayoutError(f"Seat range {part!r} must use one prefix on both ends.")
+            numbers.append(part)
+            continue
+        prefix, start, end = match.group('prefix', 'start', 'end')
+        if int(end) < int(start):
+            raise LayoutError(f"Seat range {part!r} runs backwards.")
+        width = len(start) if start.startswith('0') else 0
+        numbers.extend(f"{prefix}{n:0{width}d}" for n in range(int(start), int(end) + 1))
+    return numbers
+
+
+def _from_csv(f):
+    canteens = {}
+    for line, row in enumerate(csv.DictReader(f), start=2):
+        name = (row.get('canteen') or '').strip()
+        if not name:
+            raise LayoutError(f"Line {line}: canteen is required.")
+        canteen = canteens.setdefault(name, {'name': name, 'labs': [], 'menu': []})
+        if (row.get('lab') or '').strip():
+            canteen['labs'].append({'name': row['lab'].strip(), 'seats': row.get('seats') or ''})
+        if (row.get('item') or '').strip():
+            options = [o.strip() for o in (row.get('options') or '').split('|') if o.strip()]
+            canteen['menu'].append({'name': row['item'].strip(), 'options': options})
+    return {'canteens': list(canteens.values())}
+
+
+def load_layout(path):
+    """
+    Read a .json or .csv layout file into the JSON layout shape.
+    """
+    with open(path, newline='', encoding='utf-8') as f:
+        if path.lower().endswith('.csv'):
+            return _from_csv(f)
+        return json.load(f)
+
+
+def _bulk_create_missing(model, existing, wanted, make, batch_size, ignore_conflicts=False):
+    """
+    Create `make(key)` for every key of `wanted` not in `existing`.
+    Returns the number of objects handed to bulk_create; with
+    ignore_conflicts the caller has to count what was inserted.
+    """
+    missing = [key for key in dict.fromkeys(wanted) if key not in existing]
+    model.objects.bulk_create(
+        [make(key) for key in missing], batch_size=batch_size, ignore_conflicts=ignore_conflicts
+    )
+    return len(missing)
+
+
+def _canteen(name, created):
+    canteen = Canteen.objects.filter(name=name).order_by('id').first()
+    if canteen is None:
+        canteen = Canteen.objects.create(name=name)
+        created['canteens'] += 1
+    return canteen
+
+
+def _import_labs(canteen, labs, created, batch_size):
+    existing = dict(Lab.objects.filter(canteen=canteen).values_list('name', 'id'))
+    created['labs'] += _bulk_create_missing(
+        Lab, existing, [lab['name'] for lab in labs],
+        lambda name: Lab(canteen=canteen, name=name), batch_size,
+    )
+    lab_ids = dict(Lab.objects.filter(canteen=canteen).values_list('name', 'id'))
+
+    for lab in labs:
+        lab_id = lab_ids[lab['name']]
+        seats = Seat.objects.filter(lab_id=lab_id)
+        existing = set(seats.values_list('seat_number', flat=True))
+        # Unique (lab, seat_number): ignore_conflicts covers a concurrent
+        # import, so count what actually landed
+        _bulk_create_missing(
+            Seat, existing, parse_seat_numbers(lab.get('seats', [])),
+            lambda number: Seat(lab_id=lab_id, seat_number=number), batch_size,
+            ignore_conflicts=True,
+        )
+        created['seats'] += seats.count() - len(existing)
+    return [lab_ids[lab['name']] for lab in labs]
+
+
+def _import_menu(canteen, menu, created, batch_size):
+    existing = dict(MenuItem.objects.filter(canteen=canteen).values_list('name', 'id'))
+    created['items'] += _bulk_create_missing(
+        MenuItem, existing, [item['name'] for item in menu],
+        lambda name: MenuItem(canteen=canteen, name=name), batch_size,
+    )
+    item_ids = dict(MenuItem.objects.filter(canteen=canteen).values_list('name', 'id'))
+
+    existing = set(
+        ItemOption.objects.filter(menu_item__canteen=canteen).values_list('menu_item_id', 'name')
+    )
+    wanted = [(item_ids[item['name']], option) for item in menu for option in item.get('options', [])]
+    created['options'] += _bulk_create_missing(
+        ItemOption, existing, wanted,
+        lambda key: ItemOption(menu_item_id=key[0], name=key[1]), batch_size,
+    )
+
+
+def _provision_qr_codes(lab_ids, batch_size):
+    qr_codes = QRCode.objects.filter(seat__lab_id__in=lab_ids)
+    before = qr_codes.count()
+    seat_ids = Seat.objects.filter(lab_id__in=lab_ids, qrcode__isnull=True).values_list('id', flat=True)
+    batch = []
+    for seat_id in seat_ids.iterator(chunk_size=batch_size):
+        batch.append(QRCode(seat_id=seat_id))
+        if len(batch) >= batch_size:
+            QRCode.objects.bulk_create(batch, ignore_conflicts=True)
+            batch = []
+    if batch:
+        QRCode.objects.bulk_create(batch, ignore_conflicts=True)
+    return qr_codes.count() - before
+
+
+def import_layout(layout, batch_size=1000, dry_run=False):
+    """
+    Create whatever the layout describes that does not exist yet.
+    Returns (counts of created rows by kind, ids of the layout's labs).
+    With dry_run, the counts are computed and everything rolled back.
+    """
+    canteens = layout.get('canteens')
+    if not isinstance(canteens, list):
+        raise LayoutError("Layout needs a 'canteens' list.")
+
+    created = Counter()
+    lab_ids = []
+    touched = []
+    with transaction.atomic():
+        for entry in canteens:
+            if not entry.get('name'):
+                raise LayoutError("Every canteen needs a name.")
+            canteen = _canteen(entry['name'], created)
+            lab_ids += _import_labs(canteen, entry.get('labs', []), created, batch_size)
+            _import_menu(canteen, entry.get('menu', []), created, batch_size)
+            touched.append(canteen.pk)
+        created['qr_codes'] = _provision_qr_codes(lab_ids, batch_size)
+
+        if dry_run:
+            transaction.set_rollback(True)
+        else:
+            # bulk_create sends no post_save, so do the menu signal's work here
+            for canteen_id in touched:
+                transaction.on_commit(lambda canteen_id=canteen_id: invalidate_menu(canteen_id))
+                if settings.PUBLISH_MENUS:
+                    transaction.on_commit(lambda canteen_id=canteen_id: publish_menu(canteen_id))
+    return created, lab_ids
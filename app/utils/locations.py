@@ -0,0 +1,174 @@
+# utils/locations.py
+import threading
+import time
+from collections import OrderedDict, namedtuple
+
+from django.conf import settings
+from django.core.cache import cache
+
+from ..models import QRCode
+
+# --------------------------------------------------
+# QR LOCATION LOOKUP
+# --------------------------------------------------
+# Resolves a scanned qr_id to its seat, lab and canteen.
+# Two tiers:
+#   1. a bounded in-process LRU (no I/O at all)
+#   2. the shared Django cache (one get)
+# and the DB (one joined query) on a miss.
+#
+# Signals clear both tiers when a QRCode, Seat, Lab or
+# Canteen changes. Other processes drop their local copy
+# after LOCAL_TTL seconds at the latest.
+# --------------------------------------------------
+
+Location = namedtuple('Location', [
+    'qr_id',
+    'is_active',
+    'seat_id',
+    'seat_number',
+    'lab_id',
+    'lab_name',
+    'canteen_id',
+    'canteen_name',
+])
+
+CACHE_KEY = "qr_location:{}"
+SHARED_TIMEOUT = 60 * 60 * 24
+
+
+class LocationLRU:
+    """
+    Thread-safe LRU of qr_id -> Location with a per-entry TTL.
+    """
+
+    def __init__(self, maxsize, ttl):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires, value = entry
+            if expires < time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def discard(self, keys):
+        with self._lock:
+            for key in keys:
+                self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+_local = LocationLRU(
+    maxsize=getattr(settings, 'QR_LOCATION_CACHE_SIZE', 10000),
+    ttl=getattr(settings, 'QR_LOCATION_LOCAL_TTL', 60),
+)
+
+
+LOCATION_FIELDS = (
+    'is_active',
+    'seat_id',
+    'seat__seat_number',
+    'seat__lab_id',
+    'seat__lab__name',
+    'seat__lab__canteen_id',
+    'seat__lab__canteen__name',
+)
+
+
+def _load(qr_id):
+    row = (
+        QRCode.objects
+        .filter(qr_id=qr_id)
+        .values_list(*LOCATION_FIELDS)
+        .first()
+    )
+    if row is None:
+        return None
+    return Location(str(qr_id), *row)
+
+
+def resolve_location(qr_id):
+    """
+    Return the Location for a qr_id (active or not), or None if unknown.
+    Unknown ids are not cached, so random ids cannot fill the LRU.
+    """
+    key = str(qr_id)
+    location = _local.get(key)
+    if location is not None:
+        return location
+
+    cached = cache.get(CACHE_KEY.format(key))
+    if cached is not None:
+        location = Location(*cached)
+    else:
+        location = _load(key)
+        if location is None:
+            return None
+        cache.set(CACHE_KEY.format(key), tuple(location), SHARED_TIMEOUT)
+
+    _local.set(key, location)
+    return location
+
+
+async def _aload(qr_id):
+    row = await (
+        QRCode.objects
+        .filter(qr_id=qr_id)
+        .values_list(*LOCATION_FIELDS)
+        .afirst()
+    )
+    if row is None:
+        return None
+    return Location(str(qr_id), *row)
+
+
+async def aresolve_location(qr_id):
+    """
+    resolve_location() for async views: same tiers, async cache and ORM.
+    """
+    key = str(qr_id)
+    location = _local.get(key)
+    if location is not None:
+        return location
+
+    cached = await cache.aget(CACHE_KEY.format(key))
+    if cached is not None:
+        location = Location(*cached)
+    else:
+        location = await _aload(key)
+        if location is None:
+            return None
+        await cache.aset(CACHE_KEY.format(key), tuple(location), SHARED_TIMEOUT)
+
+    _local.set(key, location)
+    return location
+
+
+def forget_locations(qr_ids):
+    """
+    Drop the given qr_ids from both cache tiers.
+    """
+    keys = [str(qr_id) for qr_id in qr_ids]
+    if not keys:
+        return
+    _local.discard(keys)
+    cache.delete_many([CACHE_KEY.format(key) for key in keys])
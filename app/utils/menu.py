@@ -0,0 +1,119 @@
+# utils/menu.py
+import hashlib
+import json
+import time
+
+from asgiref.sync import sync_to_async
+from django.core.cache import cache
+
+from ..models import MenuItem
+
+# --------------------------------------------------
+# MENU SNAPSHOTS
+# --------------------------------------------------
+# The customer menu of a canteen, serialized once and kept
+# in the cache under the canteen's menu version. Signals bump
+# that version on any MenuItem / ItemOption / Canteen change,
+# so readers move on to a new key and the old snapshot is
+# never read again (it expires with SNAPSHOT_TIMEOUT).
+# --------------------------------------------------
+
+SNAPSHOT_KEY = "menu_snapshot:{}:{}"
+VERSION_KEY = "menu_version:{}"
+
+# Snapshots are rebuilt from the DB at least this often (seconds),
+# in case an invalidation was missed (e.g. a raw SQL edit).
+SNAPSHOT_TIMEOUT = 60 * 60
+
+
+def get_menu_version(canteen_id):
+    key = VERSION_KEY.format(canteen_id)
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, time.time_ns(), timeout=None)
+        version = cache.get(key)
+    return version
+
+
+def menu_page_etag(menu_version, *parts):
+    """
+    ETag of a rendered menu page: the canteen's menu version plus
+    whatever else the page shows (seat, CSRF cookie).
+    """
+    raw = "|".join([str(menu_version)] + [str(p) for p in parts])
+    return '"%s"' % hashlib.sha1(raw.encode()).hexdigest()
+
+
+def invalidate_menu(canteen_id):
+    """
+    Bump the canteen's menu version, which retires its snapshot.
+    """
+    key = VERSION_KEY.format(canteen_id)
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.add(key, time.time_ns(), timeout=None)
+
+
+def build_menu(canteen_id):
+    """
+    Serialize the available menu of a canteen for the frontend JS.
+    """
+    menu_items = (
+        MenuItem.objects
+        .filter(canteen_id=canteen_id, is_available=True)
+        .prefetch_related('options')
+        .order_by('id')
+    )
+
+    items_data = []
+    for item in menu_items:
+        item_opts = [{'id': opt.id, 'name': opt.name} for opt in item.options.all()]
+
+        customizations = []
+        if item_opts:
+            customizations.append({
+                'id': 'main_option', # Single group
+                'label': 'Options',
+                'options': item_opts # List of {id, name}
+            })
+
+        items_data.append({
+            'id': item.id,
+            'name': item.name,
+            'image': 'https://placehold.co/400x300?text=' + item.name.replace(' ', '+'), # Placeholder
+            'customizations': customizations
+        })
+    return items_data
+
+
+def get_menu_snapshot(canteen_id):
+    """
+    Return {'version': ..., 'items': [...], 'json': '...'} for a canteen.
+    A warm scan costs two cache reads (version, then snapshot).
+    """
+    version = get_menu_version(canteen_id)
+    key = SNAPSHOT_KEY.format(canteen_id, version)
+    snapshot = cache.get(key)
+    if snapshot is not None:
+        return snapshot
+
+    items = build_menu(canteen_id)
+    snapshot = {'version': version, 'items': items, 'json': json.dumps(items)}
+    # A menu edit racing the build bumps the version once committed,
+    # so a stale snapshot only ever lands under a retired key
+    cache.set(key, snapshot, SNAPSHOT_TIMEOUT)
+    return snapshot
+
+
+async def aget_menu_snapshot(canteen_id):
+    """
+    get_menu_snapshot() for async views. A warm read is two async cache
+    gets; a rebuild runs the sync version in a thread.
+    """
+    version = await cache.aget(VERSION_KEY.format(canteen_id))
+    if version is not None:
+        snapshot = await cache.aget(SNAPSHOT_KEY.format(canteen_id, version))
+        if snapshot is not None:
+            return snapshot
+    return await sync_to_async(get_menu_snapshot)(canteen_id)
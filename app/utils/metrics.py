@@ -0,0 +1,186 @@
+# utils/metrics.py
+import threading
+import time
+from bisect import bisect_left
+from collections import Counter, defaultdict
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.db import connections
+from django.db.backends.signals import connection_created
+
+# --------------------------------------------------
+# REQUEST METRICS
+# --------------------------------------------------
+# In-process counters and histograms filled by
+# app.middleware.RequestMetricsMiddleware and rendered in
+# the Prometheus text format by the /metrics/ view.
+# Each worker process keeps its own numbers; scrape every
+# worker (or run one) to get the full picture.
+# --------------------------------------------------
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERY_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+
+
+class Histogram:
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def cumulative(self):
+        total = 0
+        for bound, count in zip(self.buckets + ('+Inf',), self.counts):
+            total += count
+            yield bound, total
+
+
+class MetricsRegistry:
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.requests = defaultdict(int)
+            self.latency = defaultdict(lambda: Histogram(LATENCY_BUCKETS))
+            self.queries = defaultdict(lambda: Histogram(QUERY_BUCKETS))
+            self.sql_seconds = defaultdict(float)
+            self.n_plus_one = defaultdict(int)
+
+    def record(self, view, status, duration, query_count, sql_time, repeated):
+        """
+        Record one sampled request. `repeated` is the number of
+        statements that crossed the N+1 threshold.
+        """
+        with self._lock:
+            self.requests[(view, status)] += 1
+            self.latency[view].observe(duration)
+            self.queries[view].observe(query_count)
+            self.sql_seconds[view] += sql_time
+            if repeated:
+                self.n_plus_one[view] += repeated
+
+    def render(self):
+        """
+        The current numbers in the Prometheus text exposition format.
+        """
+        lines = []
+        with self._lock:
+            lines += [
+                "# HELP canteen_requests_total Sampled requests by view and status code.",
+                "# TYPE canteen_requests_total counter",
+            ]
+            for (view, status), count in sorted(self.requests.items()):
+                lines.append(f'canteen_requests_total{{view="{view}",status="{status}"}} {count}')
+
+            for name, help_text, histograms in (
+                ('canteen_request_duration_seconds', "Request latency by view.", self.latency),
+                ('canteen_request_queries', "SQL queries per request by view.", self.queries),
+            ):
+                lines += [f"# HELP {name} {help_text}", f"# TYPE {name} histogram"]
+                for view, histogram in sorted(histograms.items()):
+                    for bound, total in histogram.cumulative():
+                        lines.append(f'{name}_bucket{{view="{view}",le="{bound}"}} {total}')
+                    lines.append(f'{name}_sum{{view="{view}"}} {histogram.sum:.6f}')
+                    lines.append(f'{name}_count{{view="{view}"}} {histogram.count}')
+
+            lines += [
+                "# HELP canteen_sql_seconds_total Time spent in SQL by view.",
+                "# TYPE canteen_sql_seconds_total counter",
+            ]
+            for view, seconds in sorted(self.sql_seconds.items()):
+                lines.append(f'canteen_sql_seconds_total{{view="{view}"}} {seconds:.6f}')
+
+            lines += [
+                "# HELP canteen_n_plus_one_total Statements repeated past the N+1 threshold in one request.",
+                "# TYPE canteen_n_plus_one_total counter",
+            ]
+            for view, count in sorted(self.n_plus_one.items()):
+                lines.append(f'canteen_n_plus_one_total{{view="{view}"}} {count}')
+        return "\n".join(lines) + "\n"
+
+
+registry = MetricsRegistry()
+
+
+# --------------------------------------------------
+# QUERY RECORDING
+# --------------------------------------------------
+# One execute wrapper is installed on every DB connection.
+# It reports to the recorders active in the current context
+# (a ContextVar), so queries an async view runs through
+# sync_to_async() in another thread are still attributed to
+# its request. Outside record_queries() it just calls through.
+# --------------------------------------------------
+
+class QueryRecorder:
+    """
+    Statement count, SQL time and per-statement repeats for one request.
+    """
+
+    def __init__(self):
+        self.count = 0
+        self.seconds = 0.0
+        self.statements = Counter()
+
+    def add(self, sql, seconds):
+        self.count += 1
+        self.seconds += seconds
+        # The SQL still has its placeholders, so the same query
+        # with different parameters counts as one statement
+        self.statements[sql] += 1
+
+
+_recorders = ContextVar('query_recorders', default=())
+
+
+def _record_query(execute, sql, params, many, context):
+    recorders = _recorders.get()
+    if not recorders:
+        return execute(sql, params, many, context)
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        elapsed = time.perf_counter() - start
+        for recorder in recorders:
+            recorder.add(sql, elapsed)
+
+
+def _add_wrapper(connection, **kwargs):
+    if _record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_record_query)
+
+
+def install_query_hook():
+    """
+    Wrap every DB connection opened from now on (and the open ones of
+    this thread). Safe to call more than once.
+    """
+    connection_created.connect(_add_wrapper, dispatch_uid='app.metrics.record_query')
+    for connection in connections.all(initialized_only=True):
+        _add_wrapper(connection)
+
+
+@contextmanager
+def record_queries():
+    """
+    Collect the queries run in this context into a QueryRecorder.
+    Nests: an outer recorder sees the inner queries too.
+    """
+    recorder = QueryRecorder()
+    token = _recorders.set(_recorders.get() + (recorder,))
+    try:
+        yield recorder
+    finally:
+        _recorders.reset(token)
@@ -0,0 +1,193 @@
+# utils/orders.py
+import uuid
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
+from django.db import IntegrityError, transaction
+
+from ..models import Order
+from .events import notify_order_changes
+from .menu import aget_menu_snapshot, get_menu_snapshot
+from .stats import adjust_order_counts
+
+# --------------------------------------------------
+# ORDER PLACEMENT
+# --------------------------------------------------
+# Validates item/option pairs against the cached menu of the
+# seat's canteen (no queries) and inserts every order of a
+# cart with one bulk INSERT in one transaction.
+# --------------------------------------------------
+
+# Most lines a single cart may hold
+MAX_CART_ITEMS = 20
+
+# --------------------------------------------------
+# IDEMPOTENCY
+# --------------------------------------------------
+# The client sends a request_id (UUID) per order attempt and
+# reuses it on retries. Keys are scoped to the scanned QR
+# (uuid5(request_id, qr_id)), so two seats sending the same
+# id never share orders. Line i of the cart is stored with
+# request_id = uuid5(key, i) (line 0 keeps the key itself),
+# so the unique constraint on Order.request_id rejects any
+# replay. The result is also remembered in the cache so
+# most replays never reach the DB.
+# --------------------------------------------------
+
+REQUEST_KEY = "order_request:{}:{}"
+REQUEST_TIMEOUT = 60 * 60 * 24
+
+
+def _to_id(value):
+    if value in (None, ''):
+        return None
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        raise ValidationError("Invalid item or option id.")
+
+
+def validate_cart(canteen_id, lines):
+    """
+    Check (item_id, option_id) pairs against the canteen's available menu.
+    Returns the pairs as ints (option_id may be None).
+    """
+    return check_cart(get_menu_snapshot(canteen_id), lines)
+
+
+def check_cart(menu, lines):
+    """
+    validate_cart() against an already loaded menu snapshot.
+    """
+    if not lines:
+        raise ValidationError("Item not selected")
+    if len(lines) > MAX_CART_ITEMS:
+        raise ValidationError(f"At most {MAX_CART_ITEMS} items per order.")
+
+    options_by_item = {
+        item['id']: {
+            opt['id']
+            for group in item['customizations']
+            for opt in group['options']
+        }
+        for item in menu['items']
+    }
+
+    cleaned = []
+    for item_id, option_id in lines:
+        item_id, option_id = _to_id(item_id), _to_id(option_id)
+        if item_id not in options_by_item:
+            raise ValidationError("Item is not available.")
+        if option_id is not None and option_id not in options_by_item[item_id]:
+            raise ValidationError("Invalid option")
+        cleaned.append((item_id, option_id))
+    return cleaned
+
+
+def parse_request_id(value):
+    """
+    The client's idempotency key as a UUID, or None if it sent none.
+    """
+    if not value:
+        return None
+    try:
+        return uuid.UUID(str(value))
+    except ValueError:
+        raise ValidationError("Invalid request id.")
+
+
+def _request_key(location, request_id):
+    return REQUEST_KEY.format(location.qr_id, request_id)
+
+
+def line_request_ids(location, request_id, count):
+    key = uuid.uuid5(request_id, str(location.qr_id))
+    return [key] + [uuid.uuid5(key, str(i)) for i in range(1, count)]
+
+
+def create_orders(location, lines, request_id=None):
+    """
+    Place one order per (item_id, option_id) line for the seat behind
+    `location`. Returns (order_ids, created); a replayed request_id
+    returns the ids of the original orders with created=False.
+    """
+    if request_id is not None:
+        order_ids = cache.get(_request_key(location, request_id))
+        if order_ids is not None:
+            return order_ids, False
+
+    lines = validate_cart(location.canteen_id, lines)
+    request_ids = line_request_ids(location, request_id, len(lines)) if request_id else [None] * len(lines)
+    orders = [
+        Order(
+            seat_id=location.seat_id,
+            canteen_id=location.canteen_id,
+            item_id=item_id,
+            option_id=option_id,
+            request_id=line_request_id,
+            status='NEW',
+        )
+        for (item_id, option_id), line_request_id in zip(lines, request_ids)
+    ]
+
+    try:
+        with transaction.atomic():
+            Order.objects.bulk_create(orders)
+            adjust_order_counts(location.canteen_id, new=len(orders))
+            transaction.on_commit(lambda: notify_order_changes(orders, created=True))
+    except IntegrityError:
+        if request_id is None:
+            raise
+        # Lost the race against a concurrent retry: return its orders
+        order_ids = [
+            str(order_id) for order_id in
+            Order.objects.filter(request_id__in=request_ids)
+            .order_by('id').values_list('order_id', flat=True)
+        ]
+        if not order_ids:
+            raise
+        created = False
+    else:
+        order_ids = [str(order.order_id) for order in orders]
+        created = True
+
+    if request_id is not None:
+        # Only once committed: a batch that rolls back must not be remembered
+        transaction.on_commit(
+            lambda: cache.set(_request_key(location, request_id), order_ids, REQUEST_TIMEOUT)
+        )
+    return order_ids, created
+
+
+# Seconds a request waits for the ingest queue before giving up
+INGEST_TIMEOUT = 30
+
+
+def place_orders(location, lines, request_id=None):
+    """
+    create_orders(), through the single-writer ingest queue when
+    settings.ORDER_INGEST_QUEUE is on.
+    """
+    if getattr(settings, 'ORDER_INGEST_QUEUE', False):
+        from .ingest import get_ingest_queue
+        return get_ingest_queue().submit(location, lines, request_id).result(INGEST_TIMEOUT)
+    return create_orders(location, lines, request_id)
+
+
+async def aplace_orders(location, lines, request_id=None):
+    """
+    place_orders() for async views. Replays and invalid carts are answered
+    from the cache without leaving the event loop; the insert itself needs
+    a transaction, which Django only offers synchronously, so it runs in
+    the shared sync thread.
+    """
+    if request_id is not None:
+        order_ids = await cache.aget(_request_key(location, request_id))
+        if order_ids is not None:
+            return order_ids, False
+
+    check_cart(await aget_menu_snapshot(location.canteen_id), lines)
+
+    return await sync_to_async(place_orders)(location, lines, request_id)
@@ -0,0 +1,50 @@
+# utils/pagination.py
+from django.core.paginator import Paginator
+from django.db import connections
+from django.utils.functional import cached_property
+
+# --------------------------------------------------
+# ESTIMATED COUNTS
+# --------------------------------------------------
+# COUNT(*) over millions of orders is a full scan on every
+# changelist page. Unfiltered lists take the row count from
+# the database's own bookkeeping instead (PostgreSQL only;
+# SQLite keeps none). Everything else counts at most
+# COUNT_LIMIT rows.
+# --------------------------------------------------
+
+
+def estimated_row_count(model, using='default'):
+    """
+    Cheap row count estimate for a table, or None if the
+    database has nothing better than COUNT(*).
+    """
+    connection = connections[using]
+    if connection.vendor != 'postgresql':
+        return None
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass",
+            [model._meta.db_table],
+        )
+        row = cursor.fetchone()
+    # -1 until the table has been vacuumed / analyzed
+    return row[0] if row and row[0] >= 0 else None
+
+
+class EstimatedCountPaginator(Paginator):
+    """
+    Paginator for admin changelists over very large tables.
+    """
+
+    COUNT_LIMIT = 100_000
+
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        if not queryset.query.where:
+            estimate = estimated_row_count(queryset.model, queryset.db)
+            if estimate is not None:
+                return estimate
+        # COUNT over a LIMITed subquery stops after COUNT_LIMIT rows
+        return queryset[:self.COUNT_LIMIT].count()
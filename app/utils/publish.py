@@ -0,0 +1,77 @@
+# utils/publish.py
+import os
+import shutil
+
+from django.conf import settings
+from django.template.loader import render_to_string
+
+from ..models import Canteen
+from .menu import get_menu_snapshot
+
+# --------------------------------------------------
+# PUBLISHED MENU PAGES
+# --------------------------------------------------
+# With settings.PUBLISH_MENUS on, each canteen's customer
+# menu is rendered once per menu change into
+#   <MENU_PUBLISH_ROOT>/<canteen_id>/index.html
+#   <MENU_PUBLISH_ROOT>/<canteen_id>/menu.json
+# and QR codes link to index.html?qr=<qr_id>, so the web
+# server hands out scans as plain files. The page asks
+# /seat_context/<qr_id>/ for its order URL and CSRF token.
+# --------------------------------------------------
+
+PLACEHOLDER_QR = '00000000-0000-0000-0000-000000000000'
+
+
+def _publish_root():
+    return getattr(settings, 'MENU_PUBLISH_ROOT', os.path.join(settings.MEDIA_ROOT, 'menus'))
+
+
+def published_menu_url(canteen_id, qr_id=None):
+    """
+    Path of a canteen's published menu page, for one seat if qr_id is given.
+    """
+    base = getattr(settings, 'MENU_PUBLISH_URL', settings.MEDIA_URL + 'menus/')
+    url = f"{base}{canteen_id}/index.html"
+    if qr_id is not None:
+        url += f"?qr={qr_id}"
+    return url
+
+
+def _write_atomic(path, content):
+    # Readers see the old file or the new one, never half of one
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        f.write(content)
+    os.replace(tmp_path, path)
+
+
+def publish_menu(canteen_id):
+    """
+    Render the canteen's menu page and JSON to the publish directory,
+    or remove them if the canteen no longer exists.
+    Returns True if the menu was published.
+    """
+    directory = os.path.join(_publish_root(), str(canteen_id))
+    if not Canteen.objects.filter(pk=canteen_id).exists():
+        shutil.rmtree(directory, ignore_errors=True)
+        return False
+
+    snapshot = get_menu_snapshot(canteen_id)
+    html = render_to_string('userHome/index.html', {
+        'canteen_id': canteen_id,
+        'menu_items_json': snapshot['json'],
+        'placeholder_qr': PLACEHOLDER_QR,
+    })
+
+    os.makedirs(directory, exist_ok=True)
+    _write_atomic(os.path.join(directory, 'menu.json'), snapshot['json'])
+    _write_atomic(os.path.join(directory, 'index.html'), html)
+    return True
+
+
+def publish_all_menus():
+    """
+    Publish every canteen's menu. Returns the number published.
+    """
+    return sum(publish_menu(canteen_id) for canteen_id in Canteen.objects.values_list('id', flat=True))
@@ -1,21 +1,347 @@
 # utils/qr.py
+import hashlib
+import os
+import tempfile
+import threading
+import zipfile
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+
 import qrcode
+import qrcode.image.svg
+from PIL import Image, ImageDraw, ImageFont
 from django.core.files.base import ContentFile
 from io import BytesIO
-from django.conf import settings 
+from django.conf import settings
+from django.utils.text import get_valid_filename
 
 def generate_qr(qr_code_obj):
+    """
+    Render and store the printable image of one QR code.
+    """
+    generate_qr_codes([qr_code_obj], workers=1, force=True)
 
-    qr_url =  f"{settings.SITE_URL}/scan/{qr_code_obj.qr_id}/"
 
-    qr = qrcode.make(qr_url)
+# --------------------------------------------------
+# ON-DEMAND RENDERING
+# --------------------------------------------------
+# Used by serve_qr_code. The output only depends on the
+# encoded URL and the render options, so it is cached by
+# a digest of those in memory and on disk, and the same
+# digest serves as the HTTP ETag. The disk tier is capped
+# at max_files; past that the least recently used files go.
+# --------------------------------------------------
+
+# Bump when the renderer output changes, to retire cached files
+RENDER_VERSION = 1
+
+FORMATS = {
+    'png': 'image/png',
+    'svg': 'image/svg+xml',
+}
+
+ERROR_CORRECTION = {
+    'L': qrcode.constants.ERROR_CORRECT_L,
+    'M': qrcode.constants.ERROR_CORRECT_M,
+    'Q': qrcode.constants.ERROR_CORRECT_Q,
+    'H': qrcode.constants.ERROR_CORRECT_H,
+}
+
+DEFAULT_BOX_SIZE = 10
+MAX_BOX_SIZE = 40
+BORDER = 4
+
+
+def render_key(data, fmt='png', box_size=DEFAULT_BOX_SIZE, error_correction='M'):
+    raw = f"{RENDER_VERSION}|{data}|{fmt}|{box_size}|{error_correction}|{BORDER}"
+    return hashlib.sha256(raw.encode()).hexdigest()[:40]
 
-    buffer = BytesIO()
-    qr.save(buffer, format="PNG")
 
-    file_name = f"{qr_code_obj.seat.lab.name}_{qr_code_obj.seat.seat_number}.png"
-    qr_code_obj.qr_image.save(
-        file_name,
-        ContentFile(buffer.getvalue()),
-        save=True
+def render_qr(data, fmt='png', box_size=DEFAULT_BOX_SIZE, error_correction='M'):
+    """
+    Encode `data` as a QR image and return the file bytes.
+    """
+    qr = qrcode.QRCode(
+        error_correction=ERROR_CORRECTION[error_correction],
+        box_size=box_size,
+        border=BORDER,
     )
+    qr.add_data(data)
+    qr.make(fit=True)
+
+    if fmt == 'svg':
+        return qr.make_image(image_factory=qrcode.image.svg.SvgPathImage).to_string()
+
+    buffer = BytesIO()
+    qr.make_image().save(buffer, format="PNG")
+    return buffer.getvalue()
+
+
+class RenderedQRCache:
+    """
+    Two-tier store of rendered images keyed by render_key():
+    a small in-process LRU in front of a directory on disk.
+    """
+
+    def __init__(self, directory, max_items=512, max_files=10000):
+        self.directory = directory
+        self.max_items = max_items
+        self.max_files = max_files
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        # Files on disk as far as this process knows; counted on first write
+        self._disk_count = None
+
+    def _path(self, key, fmt):
+        return os.path.join(self.directory, key[:2], f"{key}.{fmt}")
+
+    def _remember(self, key, content):
+        with self._lock:
+            self._memory[key] = content
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.max_items:
+                self._memory.popitem(last=False)
+
+    def get(self, key, fmt):
+        with self._lock:
+            content = self._memory.get(key)
+            if content is not None:
+                self._memory.move_to_end(key)
+                return content
+        path = self._path(key, fmt)
+        try:
+            with open(path, 'rb') as f:
+                content = f.read()
+            # mtime doubles as last use for _prune_disk()
+            os.utime(path)
+        except OSError:
+            return None
+        self._remember(key, content)
+        return content
+
+    def _disk_files(self):
+        for root, _dirs, names in os.walk(self.directory):
+            for name in names:
+                yield os.path.join(root, name)
+
+    def _prune_disk(self):
+        """
+        Drop the least recently used files until the disk tier is
+        at 90% of max_files. Returns the number of files left.
+        """
+        files = []
+        for path in self._disk_files():
+            try:
+                files.append((os.stat(path).st_mtime, path))
+            except OSError:
+                pass
+        files.sort()
+        excess = len(files) - self.max_files * 9 // 10
+        for _mtime, path in files[:max(excess, 0)]:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+        return len(files) - max(excess, 0)
+
+    def _count_new_file(self):
+        with self._lock:
+            if self._disk_count is None:
+                self._disk_count = sum(1 for _ in self._disk_files())
+            else:
+                self._disk_count += 1
+            if self._disk_count > self.max_files:
+                self._disk_count = self._prune_disk()
+
+    def set(self, key, fmt, content):
+        self._remember(key, content)
+        path = self._path(key, fmt)
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            is_new = not os.path.exists(path)
+            # Write then rename, so readers never see a partial file
+            fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path))
+            with os.fdopen(fd, 'wb') as f:
+                f.write(content)
+            os.replace(tmp_path, path)
+        except OSError:
+            # Disk tier is best effort; memory still has it
+            return
+        if is_new:
+            self._count_new_file()
+
+    def get_or_render(self, data, fmt='png', box_size=DEFAULT_BOX_SIZE, error_correction='M'):
+        key = render_key(data, fmt, box_size, error_correction)
+        content = self.get(key, fmt)
+        if content is None:
+            content = render_qr(data, fmt, box_size, error_correction)
+            self.set(key, fmt, content)
+        return content
+
+
+rendered_qr_cache = RenderedQRCache(
+    getattr(settings, 'QR_RENDER_CACHE_DIR', os.path.join(settings.MEDIA_ROOT, 'qr_cache')),
+    max_files=getattr(settings, 'QR_RENDER_CACHE_MAX_FILES', 10000),
+)
+
+
+# --------------------------------------------------
+# BULK GENERATION
+# --------------------------------------------------
+# Stored images (QRCode.qr_image) encode SITE_URL. The file
+# name carries a digest of the encoded URL, so an image is
+# up to date when the stored name matches and the file is
+# still there. Encoding runs in a process pool; storage
+# writes and the DB update stay in this process.
+# --------------------------------------------------
+
+def scan_url(qr_id, canteen_id):
+    """
+    URL the QR code `qr_id` encodes, always on SITE_URL.
+    """
+    if settings.PUBLISH_MENUS:
+        from .publish import published_menu_url
+        return settings.SITE_URL + published_menu_url(canteen_id, qr_id)
+    return f"{settings.SITE_URL}/scan/{qr_id}/"
+
+
+def qr_scan_url(qr_code_obj):
+    return scan_url(qr_code_obj.qr_id, qr_code_obj.seat.lab.canteen_id)
+
+
+def qr_label(qr_code_obj):
+    seat = qr_code_obj.seat
+    return f"{seat.lab.name} - Seat {seat.seat_number}"
+
+
+def qr_image_name(qr_code_obj):
+    """
+    Storage name the image of this QR should have right now.
+    """
+    seat = qr_code_obj.seat
+    digest = render_key(qr_scan_url(qr_code_obj))[:8]
+    return "qr_codes/" + get_valid_filename(f"{seat.lab.name}_{seat.seat_number}_{digest}.png")
+
+
+def is_qr_image_current(qr_code_obj):
+    image = qr_code_obj.qr_image
+    return bool(image) and image.name == qr_image_name(qr_code_obj) and image.storage.exists(image.name)
+
+
+def _render_png(url):
+    # Top level so it can run in a worker process
+    return render_qr(url, 'png')
+
+
+def render_many(urls, workers=None):
+    """
+    Render PNGs for the given URLs, in parallel when workers != 1.
+    Results come back in the same order as `urls`.
+    """
+    urls = list(urls)
+    if workers == 1 or len(urls) < 2:
+        return [_render_png(url) for url in urls]
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        return list(pool.map(_render_png, urls, chunksize=16))
+
+
+def generate_qr_codes(qr_codes, workers=None, force=False, batch_size=500):
+    """
+    Render and store images for the given QR codes, skipping the ones
+    already up to date unless `force`. Returns (generated, skipped).
+    """
+    from ..models import QRCode
+
+    if hasattr(qr_codes, 'select_related'):
+        qr_codes = qr_codes.select_related('seat__lab')
+    qr_codes = list(qr_codes)
+    pending = [qr for qr in qr_codes if force or not is_qr_image_current(qr)]
+
+    images = render_many([qr_scan_url(qr) for qr in pending], workers=workers)
+
+    for qr, content in zip(pending, images):
+        name = qr_image_name(qr)
+        storage = qr.qr_image.storage
+        if qr.qr_image and qr.qr_image.name != name:
+            storage.delete(qr.qr_image.name)
+        if storage.exists(name):
+            storage.delete(name)
+        qr.qr_image.name = storage.save(name, ContentFile(content))
+
+    QRCode.objects.bulk_update(pending, ['qr_image'], batch_size=batch_size)
+    return len(pending), len(qr_codes) - len(pending)
+
+
+def _stored_or_rendered(qr_codes, workers=None):
+    """
+    Yield (qr, png_bytes) using stored images where they are current.
+    """
+    qr_codes = list(qr_codes)
+    missing = [qr for qr in qr_codes if not is_qr_image_current(qr)]
+    rendered = dict(zip(
+        [qr.pk for qr in missing],
+        render_many([qr_scan_url(qr) for qr in missing], workers=workers),
+    ))
+    for qr in qr_codes:
+        if qr.pk in rendered:
+            yield qr, rendered[qr.pk]
+        else:
+            with qr.qr_image.open('rb') as f:
+                yield qr, f.read()
+
+
+def write_qr_zip(qr_codes, fileobj, workers=None):
+    """
+    Write a ZIP of PNGs, one folder per lab, into `fileobj`.
+    """
+    with zipfile.ZipFile(fileobj, 'w', zipfile.ZIP_DEFLATED) as archive:
+        for qr, content in _stored_or_rendered(qr_codes, workers):
+            seat = qr.seat
+            archive.writestr(
+                f"{get_valid_filename(seat.lab.name)}/{get_valid_filename(seat.seat_number)}.png",
+                content,
+            )
+
+
+# A4 at 150 dpi
+SHEET_SIZE = (1240, 1754)
+SHEET_MARGIN = 60
+SHEET_DPI = 150
+
+
+def write_qr_sheet_pdf(qr_codes, fileobj, columns=4, rows=5, workers=None):
+    """
+    Write a multi-page, print-ready PDF of labeled QR codes into `fileobj`.
+    """
+    width, height = SHEET_SIZE
+    cell_w = (width - 2 * SHEET_MARGIN) // columns
+    cell_h = (height - 2 * SHEET_MARGIN) // rows
+    label_h = 40
+    code_size = min(cell_w, cell_h - label_h) - 20
+    font = ImageFont.load_default(size=24)
+    per_page = columns * rows
+
+    pages = []
+    for index, (qr, content) in enumerate(_stored_or_rendered(qr_codes, workers)):
+        if index % per_page == 0:
+            page = Image.new('L', SHEET_SIZE, 255)
+            draw = ImageDraw.Draw(page)
+            pages.append(page)
+
+        slot = index % per_page
+        left = SHEET_MARGIN + (slot % columns) * cell_w
+        top = SHEET_MARGIN + (slot // columns) * cell_h
+
+        code = Image.open(BytesIO(content)).convert('L').resize((code_size, code_size), Image.NEAREST)
+        page.paste(code, (left + (cell_w - code_size) // 2, top))
+        draw.text(
+            (left + cell_w // 2, top + code_size + label_h // 2),
+            qr_label(qr),
+            fill=0,
+            font=font,
+            anchor='mm',
+        )
+
+    if not pages:
+        pages.append(Image.new('L', SHEET_SIZE, 255))
+    pages[0].save(fileobj, 'PDF', resolution=SHEET_DPI, save_all=True, append_images=pages[1:])
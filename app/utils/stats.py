@@ -0,0 +1,137 @@
+# utils/stats.py
+from django.db import transaction
+from django.db.models import Count, F
+
+from ..models import Canteen, CanteenOrderStats, Order
+
+# --------------------------------------------------
+# ORDER COUNTERS
+# --------------------------------------------------
+# Reads come from CanteenOrderStats (one row per canteen).
+# Every write path that creates, delivers or deletes orders
+# must call adjust_order_counts() in the same transaction.
+# --------------------------------------------------
+
+STATUS_FIELDS = {
+    'NEW': 'new_count',
+    'DELIVERED': 'delivered_count',
+}
+
+
+def adjust_order_counts(canteen_id, new=0, delivered=0):
+    """
+    Add the given deltas to a canteen's counters.
+    """
+    if not (new or delivered):
+        return
+    changes = {
+        'new_count': F('new_count') + new,
+        'delivered_count': F('delivered_count') + delivered,
+    }
+    if not CanteenOrderStats.objects.filter(canteen_id=canteen_id).update(**changes):
+        CanteenOrderStats.objects.get_or_create(canteen_id=canteen_id)
+        CanteenOrderStats.objects.filter(canteen_id=canteen_id).update(**changes)
+
+
+def record_status_change(canteen_id, old_status, new_status):
+    """
+    Update the counters for one order going from old_status to
+    new_status. None stands for "no order" (created / deleted).
+    """
+    if old_status == new_status or canteen_id is None:
+        return
+    deltas = {}
+    if old_status in STATUS_FIELDS:
+        deltas[STATUS_FIELDS[old_status]] = -1
+    if new_status in STATUS_FIELDS:
+        deltas[STATUS_FIELDS[new_status]] = deltas.get(STATUS_FIELDS[new_status], 0) + 1
+    adjust_order_counts(
+        canteen_id,
+        new=deltas.get('new_count', 0),
+        delivered=deltas.get('delivered_count', 0),
+    )
+
+
+def get_order_counts(canteen_ids):
+    """
+    Return {canteen_id: {'new_count': n, 'delivered_count': n}}
+    for the given canteens.
+    """
+    counts = {
+        cid: {'new_count': 0, 'delivered_count': 0}
+        for cid in canteen_ids
+    }
+    rows = CanteenOrderStats.objects.filter(canteen_id__in=canteen_ids).values_list(
+        'canteen_id', 'new_count', 'delivered_count'
+    )
+    for canteen_id, new_count, delivered_count in rows:
+        counts[canteen_id] = {'new_count': new_count, 'delivered_count': delivered_count}
+    return counts
+
+
+def get_manager_order_counts(user):
+    """
+    Counters of every canteen the user manages, in one query:
+    {canteen_id: {'name': ..., 'new_count': n, 'delivered_count': n}}.
+    """
+    rows = (
+        Canteen.objects.filter(active_manager=user)
+        .order_by('name', 'id')
+        .values_list('id', 'name', 'order_stats__new_count', 'order_stats__delivered_count')
+    )
+    return {
+        canteen_id: {
+            'name': name,
+            # No stats row yet means no orders yet
+            'new_count': new_count or 0,
+            'delivered_count': delivered_count or 0,
+        }
+        for canteen_id, name, new_count, delivered_count in rows
+    }
+
+
+def total_order_counts(counts):
+    """
+    Sum a get_order_counts() result into one pair of totals.
+    """
+    return {
+        'new_count': sum(c['new_count'] for c in counts.values()),
+        'delivered_count': sum(c['delivered_count'] for c in counts.values()),
+    }
+
+
+def count_orders(canteen_ids=None):
+    """
+    Count orders straight from the Order table, grouped by canteen.
+    Used to rebuild the counters; not for request paths.
+    """
+    orders = Order.objects.all()
+    if canteen_ids is not None:
+        orders = orders.filter(canteen__in=canteen_ids)
+    counts = {}
+    rows = orders.values_list('canteen', 'status').annotate(total=Count('id')).order_by()
+    for canteen_id, status, total in rows:
+        if status in STATUS_FIELDS:
+            counts.setdefault(canteen_id, {'new_count': 0, 'delivered_count': 0})
+            counts[canteen_id][STATUS_FIELDS[status]] = total
+    return counts
+
+
+def rebuild_order_counts(canteen_ids=None):
+    """
+    Recount orders and overwrite the counters.
+    Returns {canteen_id: (old_counts, new_counts)} for rows that drifted.
+    """
+    if canteen_ids is None:
+        canteen_ids = list(Canteen.objects.values_list('id', flat=True))
+
+    drifted = {}
+    with transaction.atomic():
+        actual = count_orders(canteen_ids)
+        stored = get_order_counts(canteen_ids)
+        for canteen_id in canteen_ids:
+            fresh = actual.get(canteen_id, {'new_count': 0, 'delivered_count': 0})
+            if stored[canteen_id] != fresh:
+                drifted[canteen_id] = (stored[canteen_id], fresh)
+            CanteenOrderStats.objects.update_or_create(canteen_id=canteen_id, defaults=fresh)
+    return drifted
@@ -1,113 +1,354 @@
-from django.shortcuts import render, get_object_or_404, redirect
-from django.http import JsonResponse, HttpResponse,HttpResponseForbidden
-from django.views.decorators.http import require_POST
+from django.conf import settings
+from django.shortcuts import render, redirect
+from django.http import Http404, JsonResponse, HttpResponse,HttpResponseForbidden, HttpResponseBadRequest, HttpResponseNotModified, StreamingHttpResponse
+from django.template.loader import render_to_string
+from django.utils import timezone
+from django.views.decorators.http import condition, require_POST
 from django.db import transaction
-from .models import Order, QRCode, MenuItem, ItemOption, Canteen
+from .models import Order, Canteen
+from django.core.exceptions import ValidationError
 import json
+import uuid
+import asyncio
+from datetime import timedelta
+from asgiref.sync import sync_to_async
 from django.contrib.auth.decorators import login_required
 from django.views.decorators.cache import never_cache
 from django.views.decorators.csrf import csrf_exempt
-import qrcode
-from io import BytesIO
+from django.middleware.csrf import get_token
 from django.urls import reverse
+from .utils.feed import (
+    orders_etag, etag_matches, encode_cursor, decode_cursor, changed_since,
+    encode_page_cursor, decode_page_cursor, after_page_cursor, managed_canteen_ids,
+    get_canteens_version,
+)
+from .utils.cards import get_cards_version, render_order_cards
+from .utils.delivery import REPORT_GROUPS, build_delivery_report
+from .utils.events import get_broker
+from .utils.locations import aresolve_location, resolve_location
+from .utils.menu import aget_menu_snapshot, get_menu_snapshot, menu_page_etag
+from .utils.metrics import registry as metrics_registry
+from .utils.orders import aplace_orders, place_orders, parse_request_id
+from .utils.publish import published_menu_url
+from .utils.qr import (
+    DEFAULT_BOX_SIZE, ERROR_CORRECTION, FORMATS, MAX_BOX_SIZE, render_key, rendered_qr_cache, scan_url,
+)
+from .utils.stats import get_manager_order_counts, get_order_counts, total_order_counts
 
 @login_required
 def dashboard(request):
-    # Get all canteens managed by this user
-    my_canteens = Canteen.objects.filter(active_manager=request.user)
-    
-    new_count = Order.objects.filter(status='NEW', seat__lab__canteen__in=my_canteens).count()
-    delivered_count = Order.objects.filter(status='DELIVERED', seat__lab__canteen__in=my_canteens).count()
-    context = {
-        'new_count': new_count,
-        'delivered_count': delivered_count
-    }
+    # Counters of all canteens managed by this user, one query
+    context = total_order_counts(get_manager_order_counts(request.user))
     return render(request, 'adminDash/index.html', context)
 
+# Orders per page of the DELIVERED list
+ORDER_PAGE_SIZE = 50
+
+
+@login_required
 def get_new_orders(request):
+    """
+    Order list for the dashboard.
+
+    Without `since` the list is rendered as HTML, and the cursor
+    to continue from is returned in the X-Orders-Cursor header.
+    With `since=<cursor>` only orders changed after the cursor are
+    returned as JSON: cards to insert/replace and ids to remove.
+    Both forms carry an ETag built from the canteen change versions.
+
+    The DELIVERED list is paged newest first: `window` is `today`
+    (default) or `all`, `before=<page cursor>` fetches the next page,
+    whose cursor comes back in the X-Next-Page header.
+    """
     status = request.GET.get('status', 'NEW')
-    # Filter by user's assigned canteens
-    my_canteens = Canteen.objects.filter(active_manager=request.user)
-    orders = Order.objects.filter(status=status, seat__lab__canteen__in=my_canteens).order_by('-created_at')
-    return render(request, 'adminDash/order_list_partial.html', {'orders': orders})
+    since = request.GET.get('since')
+    before = request.GET.get('before')
+    window = request.GET.get('window', 'today' if status == 'DELIVERED' else 'all')
+
+    # Filter by user's assigned canteens (cached, so a 304 costs no query)
+    canteen_ids = managed_canteen_ids(request.user)
+
+    # The cards version covers lab / item renames shown on the cards
+    etag = orders_etag(canteen_ids, status, since or '', before or '', window, get_cards_version())
+    if etag_matches(request, etag):
+        response = HttpResponseNotModified()
+        response['ETag'] = etag
+        return response
+
+    orders = Order.objects.filter(canteen__in=canteen_ids).select_related('seat__lab', 'item', 'option')
+    if window == 'today':
+        start_of_day = timezone.localtime().replace(hour=0, minute=0, second=0, microsecond=0)
+        orders = orders.filter(created_at__gte=start_of_day)
+
+    next_page = None
+    if since is None:
+        orders = orders.filter(status=status).order_by('-created_at', '-id')
+        if before is not None:
+            position = decode_page_cursor(before)
+            if position is None:
+                return HttpResponseBadRequest("Invalid page cursor")
+            orders = after_page_cursor(orders, *position)
+
+        if status == 'DELIVERED' or before is not None:
+            # One extra row tells whether another page exists
+            orders = list(orders[:ORDER_PAGE_SIZE + 1])
+            if len(orders) > ORDER_PAGE_SIZE:
+                orders = orders[:ORDER_PAGE_SIZE]
+                next_page = encode_page_cursor(orders[-1])
+            elif window == 'today' and Order.objects.filter(
+                canteen__in=canteen_ids, status=status, created_at__lt=start_of_day,
+            ).exists():
+                # Today is exhausted; older days continue from midnight
+                next_page = f"{encode_cursor(start_of_day)}.0"
+        else:
+            orders = list(orders)
+
+        response = render(request, 'adminDash/order_list_partial.html', {
+            'cards': render_order_cards(orders),
+            'hide_empty': before is not None,
+        })
+        newest = max((o.updated_at for o in orders), default=None)
+        cursor = encode_cursor(newest) if newest else encode_cursor(timezone.now())
+    else:
+        cursor_dt = decode_cursor(since)
+        if cursor_dt is None:
+            return HttpResponseBadRequest("Invalid cursor")
+
+        changed = list(changed_since(orders, cursor_dt).order_by('created_at'))
+        matching = [o for o in changed if o.status == status]
+        html = render_to_string(
+            'adminDash/order_list_partial.html',
+            {'cards': render_order_cards(matching), 'hide_empty': True},
+            request=request,
+        )
+        newest = max((o.updated_at for o in changed), default=cursor_dt)
+        cursor = encode_cursor(max(newest, cursor_dt))
+        response = JsonResponse({
+            'cursor': cursor,
+            'html': html,
+            'removed': [str(o.order_id) for o in changed if o.status != status],
+        })
+
+    response['ETag'] = etag
+    response['X-Orders-Cursor'] = cursor
+    if next_page:
+        response['X-Next-Page'] = next_page
+    response['Cache-Control'] = 'private, no-cache'
+    return response
 
+def _order_stats_etag(request):
+    if not request.user.is_authenticated:
+        return None
+    # The canteens version covers renames in the per-canteen breakdown
+    return orders_etag(managed_canteen_ids(request.user), 'stats', get_canteens_version())
+
+
+@login_required
+@condition(etag_func=_order_stats_etag)
 def get_order_stats(request):
-    my_canteens = Canteen.objects.filter(active_manager=request.user)
-    new_count = Order.objects.filter(status='NEW', seat__lab__canteen__in=my_canteens).count()
-    delivered_count = Order.objects.filter(status='DELIVERED', seat__lab__canteen__in=my_canteens).count()
-    return JsonResponse({
-        'new_count': new_count,
-        'delivered_count': delivered_count
+    """
+    NEW / DELIVERED totals over the manager's canteens plus the same
+    counts per canteen, read with a single query.
+    """
+    counts = get_manager_order_counts(request.user)
+    response = JsonResponse({
+        **total_order_counts(counts),
+        'canteens': [{'id': canteen_id, **row} for canteen_id, row in counts.items()],
     })
+    response['Cache-Control'] = 'private, no-cache'
+    return response
+
+
+# Seconds between keep-alive comments on an idle stream
+STREAM_HEARTBEAT = 15
+
+
+def _sse(event, data):
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+async def order_stream(request):
+    """
+    Server-Sent Events stream of order changes for the manager's canteens.
+    Sends the per-canteen counts on connect, then one `order` event per
+    created/delivered order. Needs ASGI (see project/asgi.py); under WSGI
+    it answers 501 and the dashboard keeps polling.
+    """
+    if 'wsgi.input' in request.META:
+        return HttpResponse("Order stream requires ASGI", status=501)
+
+    user = await request.auser()
+    if not user.is_authenticated:
+        return HttpResponseForbidden()
+
+    canteen_ids = [
+        cid async for cid in
+        Canteen.objects.filter(active_manager=user).values_list('id', flat=True)
+    ]
+
+    async def events():
+        broker = get_broker()
+        subscription = broker.subscribe(canteen_ids)
+        try:
+            counts = await sync_to_async(get_order_counts)(canteen_ids)
+            yield _sse('stats', {str(cid): c for cid, c in counts.items()})
+            while True:
+                try:
+                    event = await asyncio.wait_for(subscription.queue.get(), STREAM_HEARTBEAT)
+                except asyncio.TimeoutError:
+                    yield ": keep-alive\n\n"
+                    continue
+                yield _sse(event['type'], event)
+        finally:
+            broker.unsubscribe(subscription)
+
+    response = StreamingHttpResponse(events(), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
 
 @require_POST
 @login_required
 def mark_order_done(request, order_id):
     
     # Verify user manages the canteen for this order
-    order = get_object_or_404(Order, order_id=order_id)
-    if order.seat.lab.canteen.active_manager != request.user:
+    order = Order.objects.filter(order_id=order_id).values('id', 'canteen__active_manager').first()
+    if order is None:
+        raise Http404("No Order matches the given query.")
+    if order['canteen__active_manager'] != request.user.id:
          return HttpResponseForbidden("You are not the active manager for this order's canteen.")
 
-    order.status = 'DELIVERED'
-    order.save()
+    Order.objects.filter(id=order['id']).mark_delivered()
     return JsonResponse({'status': 'success'})
 
 
+@require_POST
+@login_required
+def mark_orders_done(request):
+    """
+    Deliver many orders at once. JSON body with one of:
+        {"order_ids": ["<uuid>", ...]}
+        {"lab_id": 3}     all NEW orders of a lab
+        {"seat_id": 12}   all NEW orders of a seat
+    Orders outside the user's canteens are ignored.
+    """
+    try:
+        payload = json.loads(request.body)
+        if 'order_ids' in payload:
+            lookup = {'order_id__in': [uuid.UUID(str(o)) for o in payload['order_ids']]}
+        elif 'lab_id' in payload:
+            lookup = {'seat__lab_id': int(payload['lab_id'])}
+        elif 'seat_id' in payload:
+            lookup = {'seat_id': int(payload['seat_id'])}
+        else:
+            raise KeyError
+    except (ValueError, KeyError, TypeError, AttributeError):
+        return JsonResponse({'error': "Expected order_ids, lab_id or seat_id"}, status=400)
+
+    # Permission check once, as a filter on the user's canteens
+    my_canteens = Canteen.objects.filter(active_manager=request.user).values('id')
+    delivered = Order.objects.filter(canteen__in=my_canteens, **lookup).mark_delivered()
+    return JsonResponse({'status': 'success', 'delivered': delivered})
+
+
+def _active_location(qr_id):
+    """
+    Seat / lab / canteen for an active QR code, or 404.
+    """
+    location = resolve_location(qr_id)
+    if location is None or not location.is_active:
+        raise Http404("No active QR code matches the given query.")
+    return location
+
+
+# --------------------------------------------------
+# SEAT COOKIE
+# --------------------------------------------------
+# The scanned seat is remembered in a signed cookie rather
+# than the session, so an anonymous scan never writes a
+# session row. The cookie is only (re)sent when the seat
+# changes.
+# --------------------------------------------------
+
+SEAT_COOKIE = 'canteen_seat'
+SEAT_COOKIE_SALT = 'app.seat'
+SEAT_COOKIE_MAX_AGE = 60 * 60 * 12
+
+
+def _remembered_seat(request):
+    # max_age is checked against the signed timestamp: the browser's
+    # expiry alone would let a copied cookie live forever
+    return request.get_signed_cookie(
+        SEAT_COOKIE, default=None, salt=SEAT_COOKIE_SALT, max_age=SEAT_COOKIE_MAX_AGE,
+    )
+
+
+def _remember_seat(request, response, qr_id):
+    qr_id = str(qr_id)
+    if _remembered_seat(request) != qr_id:
+        response.set_signed_cookie(
+            SEAT_COOKIE, qr_id, salt=SEAT_COOKIE_SALT,
+            max_age=SEAT_COOKIE_MAX_AGE, httponly=True, samesite='Lax',
+        )
+    return response
+
+
+def _menu_page(request, location, menu, qr_id):
+    """
+    The customer menu page, or 304 if the browser already has it.
+    The ETag covers the menu version, the seat and the CSRF cookie
+    the page's form token belongs to, so nothing is rendered to check.
+    """
+    etag = menu_page_etag(
+        menu['version'], tuple(location), request.COOKIES.get(settings.CSRF_COOKIE_NAME, '')
+    )
+    if etag_matches(request, etag):
+        response = HttpResponseNotModified()
+    else:
+        response = render(request, 'userHome/index.html', {
+            'qr_id': qr_id,
+            'location': location,
+            'menu_items_json': menu['json'],
+        })
+    response['ETag'] = etag
+    response['Cache-Control'] = 'private, no-cache'
+    return response
+
+
 def scan_qr(request, qr_id):
-    print(request.user)
     # Validate QR code
-    qr_obj = get_object_or_404(QRCode, qr_id=qr_id, is_active=True)
+    location = _active_location(qr_id)
 
-    # Store QR in session for persistence
-    request.session['qr_id'] = str(qr_id)
+    if settings.PUBLISH_MENUS:
+        # Codes printed before publishing was switched on
+        return _remember_seat(request, redirect(published_menu_url(location.canteen_id, qr_id)), qr_id)
 
+    # Menu of this canteen, served from the cached snapshot
+    menu = get_menu_snapshot(location.canteen_id)
 
-    # Get seat, lab and canteen
-    seat = qr_obj.seat
-    canteen = seat.lab.canteen
+    # Remember the seat for order_success
+    return _remember_seat(request, _menu_page(request, location, menu, qr_id), qr_id)
 
-    # Fetch menu only from this canteen
-    menu_items = MenuItem.objects.filter(canteen=canteen, is_available=True).prefetch_related('options')
-    
-    # Serialize for frontend JS
-    items_data = []
-
-    #loop       
-    for item in menu_items:
-        options_list = []
-        if item.options.exists():
-            opts = [opt.name for opt in item.options.all()]
-
-            pass
-
-        item_opts = []
-        for opt in item.options.all():
-            item_opts.append({'id': opt.id, 'name': opt.name})
-            
-        customizations = []
-        if item_opts:
-            customizations.append({
-                'id': 'main_option', # Single group
-                'label': 'Options',
-                'options': item_opts # List of {id, name}
-            })
-
-        items_data.append({
-            'id': item.id,
-            'name': item.name,
-            'image': 'https://placehold.co/400x300?text=' + item.name.replace(' ', '+'), # Placeholder
-            'customizations': customizations
-        })
-    
-    context = {
-        'qr_id': qr_id,
-        'canteen': canteen,
-        'seat': seat,
-        'menu_items_json': json.dumps(items_data),
-        'menu_items': menu_items # Keep for fallback or debugging
-    }
-    return render(request, 'userHome/index.html', context)
+
+@never_cache
+def seat_context(request, qr_id):
+    """
+    Seat details for the published menu pages (app/utils/publish.py):
+    where to post the order, the canteen's page, and a CSRF token
+    (the cookie is set on this response).
+    """
+    location = _active_location(qr_id)
+    return JsonResponse({
+        'qr_id': location.qr_id,
+        'seat_number': location.seat_number,
+        'lab_name': location.lab_name,
+        'canteen_id': location.canteen_id,
+        'canteen_name': location.canteen_name,
+        'menu_url': published_menu_url(location.canteen_id, qr_id),
+        'place_order_url': reverse('place_order', args=[qr_id]),
+        'csrf_token': get_token(request),
+    })
 
 
 @require_POST
@@ -117,67 +358,229 @@ def place_order(request, qr_id):
     User must be authenticated.
     """
     # Validate QR
-    qr_obj = get_object_or_404(QRCode, qr_id=qr_id, is_active=True)
+    location = _active_location(qr_id)
 
     # Get selected item
     item_id = request.POST.get('item_id')
     option_id = request.POST.get('option_id')
-    # request_id = request.POST.get('request_id') # Optional: Use if you implement idempotency with hidden field
 
     if not item_id:
         # In a real app, you might render the page again with an error message
         return HttpResponse("Error: Item not selected", status=400)
 
-    item = get_object_or_404(MenuItem, id=item_id)
-    option = None
-
-    if option_id:
-        option = get_object_or_404(ItemOption, id=option_id)
-        if option.menu_item != item:
-            return HttpResponse("Error: Invalid option", status=400)
-
-    # Create order
-    Order.objects.create(
-        seat=qr_obj.seat,
-        item=item,
-        option=option,
-        status='NEW',
-        # request_id=request_id 
-    )
-    
-    # Store QR ID in session so order_success knows context if needed
-    request.session['qr_id'] = str(qr_id)
+    # Create order (a retried request_id returns the original order)
+    try:
+        request_id = parse_request_id(request.POST.get('request_id'))
+        place_orders(location, [(item_id, option_id)], request_id)
+    except ValidationError as e:
+        return HttpResponse(f"Error: {e.messages[0]}", status=400)
+
+    # Remember the seat so order_success knows the context
+    return _remember_seat(request, redirect('order_success'), qr_id)
+
+
+@require_POST
+def place_cart_order(request, qr_id):
+    """
+    Places several orders for one seat in a single transaction.
+
+    Accepts either a JSON body:
+        {"request_id": "<uuid>",
+         "items": [{"item_id": 1, "option_id": 3}, {"item_id": 2}]}
+    answered with {"orders": [<order_id>, ...]}, or a form POST with
+    request_id and repeated item_id / option_id fields (use an empty
+    option_id for "no option"), which redirects to the success page.
+    Replaying a request_id returns the original orders (200 instead of 201).
+    """
+    location = _active_location(qr_id)
+    is_json = request.content_type == 'application/json'
+
+    if is_json:
+        try:
+            payload = json.loads(request.body)
+            lines = [(line.get('item_id'), line.get('option_id')) for line in payload['items']]
+            raw_request_id = payload.get('request_id')
+        except (ValueError, KeyError, TypeError, AttributeError):
+            return JsonResponse({'error': "Invalid cart"}, status=400)
+    else:
+        item_ids = request.POST.getlist('item_id')
+        option_ids = request.POST.getlist('option_id')
+        option_ids += [None] * (len(item_ids) - len(option_ids))
+        lines = list(zip(item_ids, option_ids))
+        raw_request_id = request.POST.get('request_id')
+
+    try:
+        order_ids, created = place_orders(location, lines, parse_request_id(raw_request_id))
+    except ValidationError as e:
+        if is_json:
+            return JsonResponse({'error': e.messages[0]}, status=400)
+        return HttpResponse(f"Error: {e.messages[0]}", status=400)
+
+    if is_json:
+        response = JsonResponse({'orders': order_ids}, status=201 if created else 200)
+    else:
+        response = redirect('order_success')
+    return _remember_seat(request, response, qr_id)
+
 
-    return redirect('order_success')
 @never_cache
 def order_success(request):
-    qr_id = request.session.get('qr_id')
+    qr_id = _remembered_seat(request)
     context = {}
     if qr_id:
-        try:
-            qr_obj = QRCode.objects.get(qr_id=qr_id)
-            context['seat'] = qr_obj.seat
+        location = resolve_location(qr_id)
+        if location is not None:
+            context['location'] = location
             context['qr_id'] = qr_id
-        except QRCode.DoesNotExist:
-            pass
-            
+
     return render(request, 'order_success.html', context)
 
 
+
+# --------------------------------------------------
+# ASYNC CUSTOMER VIEWS
+# --------------------------------------------------
+# Native async versions of the scan -> order -> success
+# flow, routed by project/asgi_urls.py when served over
+# ASGI. Warm requests are answered from the caches without
+# a thread hop; only the order INSERT runs in a thread.
+# --------------------------------------------------
+
+async def _aactive_location(qr_id):
+    location = await aresolve_location(qr_id)
+    if location is None or not location.is_active:
+        raise Http404("No active QR code matches the given query.")
+    return location
+
+
+async def scan_qr_async(request, qr_id):
+    location = await _aactive_location(qr_id)
+    if settings.PUBLISH_MENUS:
+        return _remember_seat(request, redirect(published_menu_url(location.canteen_id, qr_id)), qr_id)
+    menu = await aget_menu_snapshot(location.canteen_id)
+    return _remember_seat(request, _menu_page(request, location, menu, qr_id), qr_id)
+
+
+@require_POST
+async def place_order_async(request, qr_id):
+    location = await _aactive_location(qr_id)
+
+    item_id = request.POST.get('item_id')
+    option_id = request.POST.get('option_id')
+    if not item_id:
+        return HttpResponse("Error: Item not selected", status=400)
+
+    try:
+        request_id = parse_request_id(request.POST.get('request_id'))
+        await aplace_orders(location, [(item_id, option_id)], request_id)
+    except ValidationError as e:
+        return HttpResponse(f"Error: {e.messages[0]}", status=400)
+
+    return _remember_seat(request, redirect('order_success'), qr_id)
+
+
+@never_cache
+async def order_success_async(request):
+    qr_id = _remembered_seat(request)
+    context = {}
+    if qr_id:
+        location = await aresolve_location(qr_id)
+        if location is not None:
+            context['location'] = location
+            context['qr_id'] = qr_id
+
+    return render(request, 'order_success.html', context)
+
+
+# Rendered QR images never change for a given URL and options
+QR_IMAGE_MAX_AGE = 60 * 60 * 24 * 30
+
+
 def serve_qr_code(request, qr_id):
     """
-    Generates a QR code image on the fly.
-    Uses request.build_absolute_uri() to ensure the current host/IP is used.
+    Serves the QR code image for a seat.
+    The encoded URL is built on SITE_URL, never the request's Host
+    header, so clients cannot fill the render cache with variants.
+
+    Optional query parameters:
+        format  png (default) or svg
+        size    module size in pixels, 1-40 (default 10)
+        ec      error correction level L, M (default), Q or H
+
+    Images are cached by (URL, options) in memory and on disk, and the
+    cache key doubles as a strong ETag, so repeats never hit the encoder.
     """
-    qr_obj = get_object_or_404(QRCode, qr_id=qr_id)
-    
-    # Dynamically build the URL for the scan view
-    # This uses the host from the current request (e.g. 192.168.x.x or domain.com)
-    scan_url = request.build_absolute_uri(reverse('scan_qr', args=[qr_id]))
-    
-    # Generate QR code
-    qr = qrcode.make(scan_url)
-    buffer = BytesIO()
-    qr.save(buffer, format="PNG")
-    
-    return HttpResponse(buffer.getvalue(), content_type="image/png")
+    fmt = request.GET.get('format', 'png').lower()
+    error_correction = request.GET.get('ec', 'M').upper()
+    try:
+        box_size = int(request.GET.get('size', DEFAULT_BOX_SIZE))
+    except ValueError:
+        box_size = 0
+    if fmt not in FORMATS or error_correction not in ERROR_CORRECTION or not 1 <= box_size <= MAX_BOX_SIZE:
+        return HttpResponseBadRequest("Invalid QR image options")
+
+    location = resolve_location(qr_id)
+    if location is None:
+        raise Http404("No QR code matches the given query.")
+
+    url = scan_url(qr_id, location.canteen_id)
+    etag = '"%s"' % render_key(url, fmt, box_size, error_correction)
+    if etag_matches(request, etag):
+        response = HttpResponseNotModified()
+    else:
+        content = rendered_qr_cache.get_or_render(url, fmt, box_size, error_correction)
+        response = HttpResponse(content, content_type=FORMATS[fmt])
+
+    response['ETag'] = etag
+    response['Cache-Control'] = f'public, max-age={QR_IMAGE_MAX_AGE}'
+    return response
+
+
+@never_cache
+def metrics(request):
+    """
+    Request metrics (app.middleware.RequestMetricsMiddleware) in the
+    Prometheus text format. Staff only.
+    """
+    if not request.user.is_staff:
+        return HttpResponseForbidden()
+    return HttpResponse(metrics_registry.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+
+# Longest period the delivery report covers (days)
+REPORT_MAX_DAYS = 90
+
+
+@never_cache
+def delivery_report(request):
+    """
+    Time from order to delivery per item, lab or hour (`by`) for orders
+    placed in the last `days` days. Staff only; superusers see every
+    canteen, other staff their own. `format=json` returns the rows.
+    Reads DeliveryTimeRollup only, never Order.
+    """
+    if not request.user.is_staff:
+        return HttpResponseForbidden()
+
+    group_by = request.GET.get('by', 'item')
+    try:
+        days = int(request.GET.get('days', 7))
+    except ValueError:
+        days = 0
+    if group_by not in REPORT_GROUPS or not 1 <= days <= REPORT_MAX_DAYS:
+        return HttpResponseBadRequest("Invalid report options")
+
+    canteens = Canteen.objects.all()
+    if not request.user.is_superuser:
+        canteens = canteens.filter(active_manager=request.user)
+    end = timezone.now()
+    rows = build_delivery_report(list(canteens.values_list('id', flat=True)), end - timedelta(days=days), end, group_by)
+
+    if request.GET.get('format') == 'json':
+        return JsonResponse({'by': group_by, 'days': days, 'rows': rows})
+    return render(request, 'adminDash/delivery_report.html', {
+        'rows': rows,
+        'group_by': group_by,
+        'groups': list(REPORT_GROUPS),
+        'days': days,
+    })
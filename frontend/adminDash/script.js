@@ -7,16 +7,17 @@ const countBadge = document.getElementById('count-badge');
 const navToggle = document.getElementById('nav-toggle');
 const mainNav = document.getElementById('main-nav');
 
+let pollId = null;
+let orderStream = null;
+
 function init() {
     // Initial fetch
     fetchOrders();
     fetchStats();
 
-    // Set up polling
-    const pollId = setInterval(() => {
-        fetchOrders();
-        fetchStats();
-    }, POLL_INTERVAL);
+    // Live updates: stream when the server supports it, poll otherwise
+    startPolling();
+    openOrderStream();
 
     // Navbar toggle
     if (navToggle && mainNav) {
@@ -33,6 +34,9 @@ function init() {
             if (e.target.classList.contains('js-mark-done')) {
                 const orderId = e.target.getAttribute('data-id');
                 markAsDone(orderId);
+            } else if (e.target.classList.contains('js-mark-lab-done')) {
+                const labId = e.target.getAttribute('data-lab');
+                markManyAsDone({ lab_id: Number(labId) });
             }
         });
     }
@@ -40,6 +44,75 @@ function init() {
 
 let currentFilter = 'NEW';
 
+function startPolling() {
+    if (pollId) return;
+    pollId = setInterval(() => {
+        pollOrders();
+        fetchStats();
+    }, POLL_INTERVAL);
+}
+
+function stopPolling() {
+    clearInterval(pollId);
+    pollId = null;
+}
+
+// Per-canteen counts pushed by the order stream
+let canteenCounts = {};
+
+function openOrderStream() {
+    if (!window.EventSource) return;
+
+    orderStream = new EventSource('/order_stream/');
+
+    orderStream.onopen = () => {
+        stopPolling();
+        // Catch up on anything missed while disconnected
+        pollOrders();
+    };
+
+    orderStream.onerror = () => {
+        // The browser retries on its own; poll in the meantime
+        startPolling();
+    };
+
+    orderStream.addEventListener('stats', (e) => {
+        canteenCounts = JSON.parse(e.data);
+        renderCounts();
+    });
+
+    orderStream.addEventListener('order', (e) => {
+        const event = JSON.parse(e.data);
+        canteenCounts[event.canteen_id] = event.counts;
+        renderCounts();
+
+        if (event.status === currentFilter) {
+            applyOrderChanges({ html: event.html, removed: [] });
+        } else {
+            applyOrderChanges({ html: '', removed: [event.order_id] });
+        }
+    });
+
+    orderStream.addEventListener('resync', () => {
+        fetchOrders();
+        fetchStats();
+    });
+}
+
+function renderCounts() {
+    let newCount = 0;
+    let doneCount = 0;
+    Object.values(canteenCounts).forEach(counts => {
+        newCount += counts.new_count;
+        doneCount += counts.delivered_count;
+    });
+
+    const countNew = document.getElementById('count-new');
+    const countDone = document.getElementById('count-done');
+    if (countNew) countNew.textContent = newCount;
+    if (countDone) countDone.textContent = doneCount;
+}
+
 function setFilter(status) {
     currentFilter = status;
 
@@ -71,31 +144,134 @@ async function fetchStats() {
         if (!response.ok) return;
         const data = await response.json();
 
-        const countNew = document.getElementById('count-new');
-        const countDone = document.getElementById('count-done');
-
-        if (countNew) countNew.textContent = data.new_count;
-        if (countDone) countDone.textContent = data.delivered_count;
+        // Same per-canteen shape the order stream keeps up to date
+        canteenCounts = {};
+        data.canteens.forEach(canteen => {
+            canteenCounts[canteen.id] = {
+                new_count: canteen.new_count,
+                delivered_count: canteen.delivered_count,
+            };
+        });
+        renderCounts();
     } catch (error) {
         console.error('Error fetching stats:', error);
     }
 }
 
+// Cursor and ETag of the last order list we rendered.
+// Polls only ask for orders changed after the cursor.
+let ordersCursor = null;
+let ordersEtag = null;
+
 async function fetchOrders() {
     try {
-        const response = await fetch(`/get_new_orders/?status=${currentFilter}`);
+        const response = await fetch(`/get_new_orders/?status=${currentFilter}`, { cache: 'no-store' });
         if (!response.ok) {
             console.error('Network response was not ok');
             return;
         }
         const html = await response.text();
         ordersList.innerHTML = html;
+        ordersCursor = response.headers.get('X-Orders-Cursor');
+        ordersEtag = response.headers.get('ETag');
+        setNextPage(response.headers.get('X-Next-Page'));
         updateCount();
     } catch (error) {
         console.error('Error fetching orders:', error);
     }
 }
 
+// Keyset cursor of the next (older) page of the DELIVERED list
+let nextPage = null;
+
+function setNextPage(cursor) {
+    nextPage = cursor;
+    const button = document.getElementById('load-more');
+    if (button) button.style.display = nextPage ? 'block' : 'none';
+}
+
+async function loadMoreOrders() {
+    if (!nextPage) return;
+
+    const filter = currentFilter;
+    try {
+        const response = await fetch(
+            `/get_new_orders/?status=${filter}&window=all&before=${encodeURIComponent(nextPage)}`,
+            { cache: 'no-store' }
+        );
+        if (!response.ok || filter !== currentFilter) return;
+
+        const template = document.createElement('template');
+        template.innerHTML = await response.text();
+        template.content.querySelectorAll('.order-card').forEach(card => {
+            if (!document.getElementById(card.id)) ordersList.append(card);
+        });
+        setNextPage(response.headers.get('X-Next-Page'));
+        updateCount();
+    } catch (error) {
+        console.error('Error loading more orders:', error);
+    }
+}
+
+async function pollOrders() {
+    if (!ordersCursor) {
+        return fetchOrders();
+    }
+
+    const filter = currentFilter;
+    try {
+        const headers = {};
+        if (ordersEtag) headers['If-None-Match'] = ordersEtag;
+
+        const response = await fetch(
+            `/get_new_orders/?status=${filter}&since=${encodeURIComponent(ordersCursor)}`,
+            { cache: 'no-store', headers }
+        );
+        // Nothing changed since the last poll
+        if (response.status === 304) return;
+        if (!response.ok) {
+            console.error('Network response was not ok');
+            return;
+        }
+        // Filter switched while this request was in flight
+        if (filter !== currentFilter) return;
+
+        const data = await response.json();
+        applyOrderChanges(data);
+        ordersCursor = data.cursor;
+        ordersEtag = response.headers.get('ETag');
+    } catch (error) {
+        console.error('Error polling orders:', error);
+    }
+}
+
+function applyOrderChanges(data) {
+    data.removed.forEach(orderId => {
+        const card = document.getElementById(`order-${orderId}`);
+        if (card) card.remove();
+    });
+
+    const template = document.createElement('template');
+    template.innerHTML = data.html;
+    template.content.querySelectorAll('.order-card').forEach(card => {
+        const existing = document.getElementById(card.id);
+        if (existing) {
+            existing.replaceWith(card);
+        } else {
+            ordersList.prepend(card);
+        }
+    });
+
+    const empty = ordersList.querySelector('.orders-empty');
+    const hasCards = ordersList.querySelector('.order-card') !== null;
+    if (hasCards && empty) {
+        empty.remove();
+    } else if (!hasCards && !empty) {
+        ordersList.innerHTML = '<li class="orders-empty" style="text-align:center; padding:40px; color:#999; font-style:italic;">No new orders</li>';
+    }
+    updateCount();
+}
+
 async function markAsDone(orderId) {
     if (!orderId) return;
 
@@ -116,8 +292,8 @@ async function markAsDone(orderId) {
         });
 
         if (response.ok) {
-            // Immediate feedback: refresh orders to show updated state
-            fetchOrders();
+            // Immediate feedback: pick up the updated order
+            pollOrders();
             fetchStats();
         } else {
             console.error('Failed to update status:', response.status);
@@ -130,6 +306,34 @@ async function markAsDone(orderId) {
     }
 }
 
+// Deliver several orders in one request, e.g. { lab_id: 3 } or { order_ids: [...] }
+async function markManyAsDone(selection) {
+    try {
+        let csrftoken = document.querySelector('[name=csrfmiddlewaretoken]')?.value;
+        if (!csrftoken) {
+            csrftoken = getCookie('csrftoken');
+        }
+
+        const response = await fetch('/mark_orders_done/', {
+            method: 'POST',
+            headers: {
+                'X-CSRFToken': csrftoken,
+                'Content-Type': 'application/json'
+            },
+            body: JSON.stringify(selection)
+        });
+
+        if (response.ok) {
+            pollOrders();
+            fetchStats();
+        } else {
+            console.error('Failed to update orders:', response.status);
+        }
+    } catch (error) {
+        console.error('Error updating orders:', error);
+    }
+}
+
 function updateCount() {
     // Count the number of order cards in the list
     if (countBadge && ordersList) {
@@ -3,6 +3,13 @@ ASGI config for project project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
 
+Serves the live order stream (/order_stream/) used by the dashboard, e.g.:
+
+    uvicorn project.asgi:application
+
+and routes through project/asgi_urls.py, so the customer pages (scan,
+place order, order success) run as native async views.
+
 For more information on this file, see
 https://docs.djangoproject.com/en/6.0/howto/deployment/asgi/
 """
@@ -12,5 +19,6 @@ import os
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'project.settings')
+os.environ.setdefault('DJANGO_ROOT_URLCONF', 'project.asgi_urls')
 
 application = get_asgi_application()
@@ -0,0 +1,17 @@
+"""
+URL configuration used under ASGI (see project/asgi.py).
+
+Same routes as project/urls.py, except that the customer pages are
+served by the native async views.
+"""
+from django.urls import path
+
+from app import views
+
+from .urls import urlpatterns as sync_urlpatterns
+
+urlpatterns = [
+    path('scan/<uuid:qr_id>/', views.scan_qr_async, name='scan_qr'),
+    path('place_order/<uuid:qr_id>/', views.place_order_async, name='place_order'),
+    path('order_success/', views.order_success_async, name='order_success'),
+] + sync_urlpatterns
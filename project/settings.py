@@ -43,15 +43,29 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    # gzip, or brotli if the `brotli` package is installed
+    'app.middleware.CompressionMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
+    # 304 for any GET whose ETag / Last-Modified the client already has
+    'django.middleware.http.ConditionalGetMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'app.middleware.RequestMetricsMiddleware',
 ]
 
-ROOT_URLCONF = 'project.urls'
+# Per-view latency / SQL metrics, served at /metrics/ (staff only).
+# Fraction of requests measured; 0 takes the middleware out entirely.
+# A statement repeated more than REQUEST_METRICS_N_PLUS_ONE times in one
+# request is logged and counted as a likely N+1.
+REQUEST_METRICS_SAMPLE_RATE = 0.1
+REQUEST_METRICS_N_PLUS_ONE = 5
+
+# project/asgi.py switches to project.asgi_urls, which serves the
+# customer pages with native async views
+ROOT_URLCONF = os.environ.get('DJANGO_ROOT_URLCONF', 'project.urls')
 
 TEMPLATES = [
     {
@@ -69,15 +83,63 @@ TEMPLATES = [
 ]
 
 WSGI_APPLICATION = 'project.wsgi.application'
+ASGI_APPLICATION = 'project.asgi.application'
+
+# Live order stream (/order_stream/) fan-out.
+# The in-process broker only reaches streams served by the same process,
+# so run a single ASGI process or point this at a shared broker class.
+ORDER_EVENT_BROKER = 'app.utils.events.InProcessBroker'
 
 
 # Database
 # https://docs.djangoproject.com/en/6.0/ref/settings/#databases
 
+# SQLite tuned for many seats ordering at once:
+#   WAL            readers never block the writer (and vice versa)
+#   busy timeout   writers queue up instead of failing "database is locked"
+#   IMMEDIATE      transactions take the write lock up front, so they never
+#                  deadlock upgrading a read lock half way through
+#   CONN_MAX_AGE   keep connections (and their PRAGMAs) between requests
+
 DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        'CONN_MAX_AGE': 600,
+        'CONN_HEALTH_CHECKS': True,
+        'OPTIONS': {
+            'timeout': 20,
+            'transaction_mode': 'IMMEDIATE',
+            'init_command': (
+                'PRAGMA journal_mode=WAL;'
+                'PRAGMA synchronous=NORMAL;'
+                'PRAGMA busy_timeout=20000;'
+                'PRAGMA temp_store=MEMORY;'
+            ),
+        },
+        'TEST': {
+            # A file, not shared-cache memory, so concurrency tests get
+            # real WAL locking
+            'NAME': BASE_DIR / 'test_db.sqlite3',
+        },
+    }
+}
+
+# Funnel order inserts through one writer thread that group-commits
+# batches (app/utils/ingest.py). Worth it when many seats order at once.
+ORDER_INGEST_QUEUE = False
+
+
+# Cache
+# Order feed versions live here. With more than one worker process this
+# must be a shared backend (Redis / Memcached) so every worker sees the
+# same versions.
+# https://docs.djangoproject.com/en/6.0/topics/cache/
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'canteen',
     }
 }
 
@@ -122,4 +184,10 @@ STATICFILES_DIRS = [
 ]
 SITE_URL = "http://192.168.18.104:8000" 
 MEDIA_URL = '/media/'
-MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
\ No newline at end of file
+MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
+
+# Published customer menus (app/utils/publish.py). When on, every menu
+# change re-renders the canteen's page and JSON under MEDIA_ROOT/menus/,
+# QR codes link straight to those files and the front web server serves
+# scans without Django. Run `manage.py publish_menus` after enabling.
+PUBLISH_MENUS = False
\ No newline at end of file